@@ -1,44 +1,224 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from category import Category
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
 from course import Course
+from batch import grade_roster
+from goal_solver import CURVE_STRATEGIES, STRATEGIES
+from policies import parse_policy
+from simulation import simulate_whatif
+from storage import SQLiteCourseStore
+from schema import cache_stats as schema_cache_stats, compile_schema, config_hash, invalidate_schema
+from result_cache import ResultCache, SharedResultCache, result_key
+from gradebook import FORMATS, export, grade_rows, read_rows
+from catalog import DictCatalog, SQLiteCatalog
+from grading_session import GradingSession, SessionStore
+from whatif_grid import parse_axes, whatif_grid
+from cohort import CohortStats
+import metrics
+import rendering
+from metrics import phase
+import io
 import json
 import os
+import threading
+import uuid
 
 app = Flask(__name__)
 app.secret_key = 'grade-calculator-secret-key-change-in-production'  # Change this in production
 
+# Predefined course templates come from a catalog. Large catalogs are served from an
+# indexed SQLite file (built with catalog.py) and loaded one course at a time.
+app.config.setdefault('COURSE_CATALOG', os.environ.get('GRADE_CALCULATOR_CATALOG'))
+
 # Load predefined course configurations from external file (if it exists)
 # This file is gitignored so predefined courses won't be published
 # Users can create their own predefined_courses.py with their courses
 COURSE_CONFIGS = {}
-try:
-    from predefined_courses import COURSE_CONFIGS as PREDEFINED_CONFIGS
-    COURSE_CONFIGS = PREDEFINED_CONFIGS
-except ImportError:
-    # No predefined courses file - users start with an empty list
-    # They can create their own courses using the course builder
-    COURSE_CONFIGS = {}
-
-def get_all_courses():
-    """Get all courses including predefined and custom ones"""
-    all_courses = {}
-    all_courses.update(COURSE_CONFIGS)
-    
-    # Add custom courses from session
+if app.config['COURSE_CATALOG']:
+    course_catalog = SQLiteCatalog(app.config['COURSE_CATALOG'])
+else:
+    try:
+        from predefined_courses import COURSE_CONFIGS as PREDEFINED_CONFIGS
+        COURSE_CONFIGS = PREDEFINED_CONFIGS
+    except ImportError:
+        # No predefined courses file - users start with an empty list
+        # They can create their own courses using the course builder
+        COURSE_CONFIGS = {}
+    course_catalog = DictCatalog(COURSE_CONFIGS)
+
+# Courses per page on the home page
+COURSES_PER_PAGE = 60
+
+# Custom courses live in a server-side store; the session only carries an opaque user ID.
+# Any storage.CourseStore implementation can be swapped in here.
+app.config.setdefault('COURSE_DB', os.environ.get('GRADE_CALCULATOR_DB', os.path.join(app.root_path, 'courses.db')))
+course_store = SQLiteCourseStore(app.config['COURSE_DB'])
+
+# Rendered calculation results, keyed on the same hash that is sent as the ETag. With several
+# worker processes, point GRADE_CALCULATOR_RESULT_CACHE at an SQLite file they all share.
+app.config.setdefault('RESULT_CACHE_DB', os.environ.get('GRADE_CALCULATOR_RESULT_CACHE'))
+if app.config['RESULT_CACHE_DB']:
+    result_cache = SharedResultCache(app.config['RESULT_CACHE_DB'])
+else:
+    result_cache = ResultCache()
+
+# Open incremental grading sessions. They live in this process, so a deployment with
+# several workers needs sticky sessions for the /session routes.
+grading_sessions = SessionStore()
+
+# Cohort statistics per course and config, fed by the roster and gradebook routes
+cohorts = {}
+cohorts_lock = threading.Lock()
+
+# Upper bound on simulated scenarios per request
+MAX_SCENARIOS = 200000
+
+# Opt-in: preload templates and render config-dependent page fragments once per course schema
+app.config.setdefault('FRAGMENT_CACHE', os.environ.get('GRADE_CALCULATOR_FRAGMENT_CACHE') == '1')
+fragment_renderer = rendering.init_app(app)
+
+# Per-route request counters and latency histograms, exposed at /metrics
+metrics.init_app(app)
+metrics.registry.counter_callback('grade_calculator_cache_hits_total', "Cache hits, by cache",
+                                  lambda: result_cache.hits, (('cache', 'result'),))
+metrics.registry.counter_callback('grade_calculator_cache_misses_total', "Cache misses, by cache",
+                                  lambda: result_cache.misses, (('cache', 'result'),))
+metrics.registry.counter_callback('grade_calculator_cache_hits_total', "Cache hits, by cache",
+                                  lambda: schema_cache_stats['hits'], (('cache', 'schema'),))
+metrics.registry.counter_callback('grade_calculator_cache_misses_total', "Cache misses, by cache",
+                                  lambda: schema_cache_stats['misses'], (('cache', 'schema'),))
+if fragment_renderer is not None:
+    metrics.registry.counter_callback('grade_calculator_cache_hits_total', "Cache hits, by cache",
+                                      lambda: fragment_renderer.hits, (('cache', 'fragment'),))
+    metrics.registry.counter_callback('grade_calculator_cache_misses_total', "Cache misses, by cache",
+                                      lambda: fragment_renderer.misses, (('cache', 'fragment'),))
+
+def get_user_id():
+    """Get the opaque ID that owns this user's custom courses"""
+    if 'user_id' not in session:
+        session['user_id'] = uuid.uuid4().hex
+    user_id = session['user_id']
+    
+    # Move courses saved by older versions out of the session cookie
     if 'custom_courses' in session:
-        all_courses.update(session['custom_courses'])
+        for course_name, config in session.pop('custom_courses').items():
+            course_store.save_course(user_id, course_name, config)
     
-    return all_courses
+    return user_id
+
+def get_course_config(course_name):
+    """Get a single course config, custom courses taking precedence, or None"""
+    return get_course_and_owner(course_name)[0]
+
+def get_course_and_owner(course_name):
+    """
+    Returns (config, owner) of a course: owner is the user ID for a custom
+    course and None for a predefined one; config is None if there is no such course
+    """
+    with phase('lookup'):
+        user_id = get_user_id()
+        config = course_store.get_course(user_id, course_name)
+        if config is not None:
+            return config, user_id
+        return course_catalog.get(course_name), None
+
+def get_cohort(course_name, schema, owner=None):
+    """
+    The cohort statistics of a course. Custom courses have one cohort per owner,
+    and editing a course starts a new cohort.
+    """
+    key = (owner, course_name, schema.hash)
+    with cohorts_lock:
+        cohort = cohorts.get(key)
+        if cohort is None:
+            cohort = cohorts[key] = CohortStats(schema)
+    return cohort
+
+def drop_cohort(owner, course_name, config):
+    """Forget the cohort statistics of one version of a course"""
+    with cohorts_lock:
+        cohorts.pop((owner, course_name, config_hash(config)), None)
+
+def wants_cohort():
+    """True when the request asked for its roster to be added to the course's cohort"""
+    return request.args.get('cohort') in ('1', 'true')
+
+def wants_json():
+    """True when the client asked for JSON instead of a rendered page"""
+    if request.args.get('format') == 'json':
+        return True
+    best = request.accept_mimetypes.best_match(['text/html', 'application/json'])
+    return best == 'application/json'
+
+def cached_result(key, as_json, render, course_hash=None):
+    """
+    Answer a calculation request from the result cache when possible.
+    
+    Args:
+        key: Hash of everything the result depends on
+        as_json: Whether to respond with JSON instead of HTML
+        render: Function that computes the result, returning a dict for JSON
+            or a rendered page for HTML; only called on a cache miss
+        course_hash: Config hash of the course, so editing or deleting the
+            course can drop the cached result
+    """
+    etag = f"{key}-json" if as_json else f"{key}-html"
+    
+    # The client already has this exact result
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        cached = result_cache.get(etag)
+        if cached is None:
+            body = render()
+            if as_json:
+                with phase('serialize'):
+                    cached = (json.dumps(body), 'application/json')
+            else:
+                cached = (body, 'text/html')
+            result_cache.put(etag, *cached, course_hash)
+        response = Response(cached[0], mimetype=cached[1])
+    
+    response.set_etag(etag)
+    response.vary.add('Accept')
+    return response
 
 @app.route('/')
 def index():
-    """Home page showing available courses"""
-    all_courses = get_all_courses()
-    custom_courses = session.get('custom_courses', {})
+    """Home page showing available courses, one page of predefined courses at a time"""
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    custom_courses = course_store.list_names(get_user_id())
+    if query:
+        custom_courses = [name for name in custom_courses if query.casefold() in name.casefold()]
+    
+    # Fetch one extra name to know whether there is a next page
+    offset = (page - 1) * COURSES_PER_PAGE
+    predefined_courses = course_catalog.search(query, offset, COURSES_PER_PAGE + 1)
+    has_next = len(predefined_courses) > COURSES_PER_PAGE
+    
     return render_template('index.html', 
-                         courses=all_courses.keys(),
-                         predefined_courses=list(COURSE_CONFIGS.keys()),
-                         custom_courses=list(custom_courses.keys()))
+                         predefined_courses=predefined_courses[:COURSES_PER_PAGE],
+                         custom_courses=custom_courses,
+                         query=query,
+                         page=page,
+                         has_next=has_next)
+
+@app.route('/courses/search')
+def search_courses():
+    """Predefined course names matching ?q= (substring, or prefix with ?match=prefix), paginated"""
+    query = request.args.get('q', '').strip()
+    match = request.args.get('match', 'substring')
+    if match not in ('substring', 'prefix'):
+        return jsonify({"error": "match must be substring or prefix"}), 400
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    
+    return jsonify({
+        "query": query,
+        "total": course_catalog.count(query, match),
+        "offset": offset,
+        "courses": course_catalog.search(query, offset, limit, match)
+    })
 
 @app.route('/create-course', methods=['GET', 'POST'])
 def create_course():
@@ -46,8 +226,8 @@ def create_course():
     if request.method == 'GET':
         course_name = request.args.get('edit')
         course_config = None
-        if course_name and 'custom_courses' in session and course_name in session['custom_courses']:
-            course_config = session['custom_courses'][course_name]
+        if course_name:
+            course_config = course_store.get_course(get_user_id(), course_name)
         
         return render_template('create_course.html', course_name=course_name, course_config=course_config)
     
@@ -60,50 +240,74 @@ def create_course():
     if not course_name:
         return jsonify({"error": "Course name is required"}), 400
     
-    # Initialize custom_courses in session if needed
-    if 'custom_courses' not in session:
-        session['custom_courses'] = {}
-    
     # Validate categories
     categories = []
     for cat_data in categories_data:
         if not cat_data.get('name') or not cat_data.get('item_count') or not cat_data.get('max_score'):
             continue
-        categories.append({
+        category = {
             'name': cat_data['name'],
             'item_count': int(cat_data['item_count']),
             'max_score': float(cat_data['max_score'])
-        })
+        }
+        # Optional grading policies: drop_lowest / keep_best and cap
+        for field in ('drop_lowest', 'keep_best', 'cap'):
+            if cat_data.get(field) not in (None, ''):
+                category[field] = cat_data[field]
+        try:
+            keep, cap = parse_policy(category)
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+        if 'drop_lowest' in category or 'keep_best' in category:
+            category.pop('drop_lowest', None)
+            category.pop('keep_best', None)
+            if keep is not None:
+                category['drop_lowest'] = category['item_count'] - keep
+        if cap is not None:
+            category['cap'] = cap
+        categories.append(category)
     
     if not categories:
         return jsonify({"error": "At least one category is required"}), 400
     
-    # Save course
-    session['custom_courses'][course_name] = {
+    # Save course, then drop the compiled schema, cached results and cohort of the version it replaced
+    user_id = get_user_id()
+    previous_config = course_store.get_course(user_id, course_name)
+    
+    course_store.save_course(user_id, course_name, {
         'categories': categories,
         'total_score': total_score
-    }
-    session.modified = True
+    })
+    
+    if previous_config is not None:
+        invalidate_schema(previous_config)
+        result_cache.invalidate(config_hash(previous_config))
+        drop_cohort(user_id, course_name, previous_config)
     
     return jsonify({"success": True, "redirect": url_for('course_form', course_name=course_name)})
 
 @app.route('/delete-course/<course_name>', methods=['POST'])
 def delete_course(course_name):
     """Delete a custom course"""
-    if 'custom_courses' in session and course_name in session['custom_courses']:
-        del session['custom_courses'][course_name]
-        session.modified = True
+    user_id = get_user_id()
+    config = course_store.get_course(user_id, course_name)
+    if config is not None and course_store.delete_course(user_id, course_name):
+        invalidate_schema(config)
+        result_cache.invalidate(config_hash(config))
+        drop_cohort(user_id, course_name, config)
         return jsonify({"success": True})
     return jsonify({"error": "Course not found"}), 404
 
 @app.route('/course/<course_name>')
 def course_form(course_name):
     """Display form for inputting grades for a specific course"""
-    all_courses = get_all_courses()
-    if course_name not in all_courses:
+    user_id = get_user_id()
+    config = course_store.get_course(user_id, course_name)
+    is_custom = config is not None
+    if config is None:
+        config = course_catalog.get(course_name)
+    if config is None:
         return "Course not found", 404
-    config = all_courses[course_name]
-    is_custom = course_name in session.get('custom_courses', {})
     return render_template('course_form.html', course_name=course_name, config=config, is_custom=is_custom)
 
 @app.route('/calculate', methods=['POST'])
@@ -112,51 +316,80 @@ def calculate():
     data = request.json
     course_name = data.get('course_name')
     
-    all_courses = get_all_courses()
-    if course_name not in all_courses:
+    config = get_course_config(course_name)
+    if config is None:
         return jsonify({"error": "Course not found"}), 404
     
-    config = all_courses[course_name]
-    categories = []
+    # Parse the form data straight into the compiled course layout
+    with phase('parse'):
+        schema = compile_schema(config)
+        scores = schema.parse(data)
+        submitted = {key: data[key] for key in schema.keys if key in data}
+    as_json = wants_json()
     
-    # Build categories from form data
-    for cat_config in config['categories']:
-        cat_name = cat_config['name']
-        scores = []
+    def render():
+        with phase('build'):
+            course = Course.from_schema(course_name, schema, scores)
         
-        # Get scores for this category
-        for i in range(cat_config['item_count']):
-            key = f"{cat_name}_{i}"
-            score = data.get(key, 0)
-            try:
-                scores.append(float(score) if score else 0)
-            except (ValueError, TypeError):
-                scores.append(0)
+        # Prepare results data
+        with phase('compute'):
+            results = course.results()
         
-        category = Category(cat_name, scores, cat_config['max_score'])
-        categories.append(category)
+        if as_json:
+            return results
+        with phase('render'):
+            fragments = None
+            if fragment_renderer is not None:
+                fragments = fragment_renderer.results_page(schema, results, submitted)
+            return render_template('results.html', results=results, current_scores=submitted, config=config,
+                                   fragments=fragments)
+    
+    # The page echoes the submitted values back into its forms, so they are part of the key
+    key = result_key('calculate', course_name, schema.hash, scores, submitted)
+    return cached_result(key, as_json, render, schema.hash)
+
+@app.route('/calculate/batch', methods=['POST'])
+def calculate_batch():
+    """Calculate grades for a whole roster in one request"""
+    data = request.json
+    course_name = data.get('course_name')
+    students = data.get('students', [])
     
-    # Create course and calculate results
-    course = Course(course_name, categories, config['total_score'])
+    config, owner = get_course_and_owner(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
     
-    # Prepare results data
-    results = {
-        "course_name": course_name,
-        "categories": [],
-        "total_achieved": course.total_achieved_score(),
-        "total_max": config['total_score'],
-        "total_percentage": (course.total_achieved_score() / config['total_score']) * 100
-    }
+    if not isinstance(students, list) or not all(isinstance(s, dict) for s in students):
+        return jsonify({"error": "students must be a list of score objects"}), 400
     
-    for category in categories:
-        results["categories"].append({
-            "name": category.name,
-            "achieved": category.achieved_score(),
-            "max_score": category.max_score,
-            "percentage": category.percentage()
-        })
+    # Only rosters sent with ?cohort=1 count towards the cohort, so re-grading a roster doesn't skew it
+    cohort = get_cohort(course_name, compile_schema(config), owner) if wants_cohort() else None
+    results = grade_roster(course_name, config, students, cohort)
     
-    return render_template('results.html', results=results, current_scores=data, config=config)
+    return jsonify({"course_name": course_name, "count": len(results), "results": results})
+
+@app.route('/gradebook/<course_name>', methods=['POST'])
+def grade_gradebook(course_name):
+    """Grade an uploaded CSV or JSON-lines gradebook, streaming the graded rows back"""
+    config, owner = get_course_and_owner(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
+    
+    # The gradebook is the raw request body, read incrementally as rows are graded
+    default_format = 'jsonl' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv'
+    input_format = request.args.get('format', default_format)
+    output_format = request.args.get('output_format', 'csv')
+    if input_format not in FORMATS or output_format not in FORMATS:
+        return jsonify({"error": f"Format must be one of: {', '.join(FORMATS)}"}), 400
+    
+    rows = read_rows(io.TextIOWrapper(request.stream, encoding='utf-8', newline=''), input_format)
+    cohort = get_cohort(course_name, compile_schema(config), owner) if wants_cohort() else None
+    body = export(grade_rows(config, rows, id_column=request.args.get('id_column'), cohort=cohort), output_format)
+    
+    if output_format == 'csv':
+        return Response(stream_with_context(body), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename="{course_name} graded.csv"'})
+    return Response(stream_with_context(body), mimetype='application/x-ndjson')
 
 @app.route('/goal', methods=['POST'])
 def calculate_goal():
@@ -164,46 +397,74 @@ def calculate_goal():
     data = request.json
     course_name = data.get('course_name')
     target_grade = float(data.get('target_grade', 0))
+    strategy = data.get('strategy', 'balanced')
+    
+    if strategy not in STRATEGIES:
+        return jsonify({"error": f"Unknown goal strategy: {strategy}"}), 400
     
-    all_courses = get_all_courses()
-    if course_name not in all_courses:
+    config = get_course_config(course_name)
+    if config is None:
         return jsonify({"error": "Course not found"}), 404
     
-    config = all_courses[course_name]
-    categories = []
-    current_scores_by_item = {}
+    with phase('parse'):
+        schema = compile_schema(config)
+        current_scores = schema.parse(data)
+    as_json = wants_json()
     
-    # Build categories from form data and track individual item scores
-    for cat_config in config['categories']:
-        cat_name = cat_config['name']
-        scores = []
-        
-        for i in range(cat_config['item_count']):
-            key = f"{cat_name}_{i}"
-            score = data.get(key, 0)
-            try:
-                score_val = float(score) if score else 0
-                scores.append(score_val)
-                current_scores_by_item[key] = score
-            except (ValueError, TypeError):
-                scores.append(0)
-                current_scores_by_item[key] = 0
+    def render():
+        with phase('build'):
+            course = Course.from_schema(course_name, schema, current_scores)
+        with phase('compute'):
+            goal_scores = course.goal_scores_from_array(target_grade, current_scores, schema, strategy)
+            current_total = course.total_achieved_score()
         
-        category = Category(cat_name, scores, cat_config['max_score'])
-        categories.append(category)
+        if as_json:
+            return {
+                "course_name": course_name,
+                "target_grade": target_grade,
+                "strategy": strategy,
+                "current_total": current_total,
+                "goal_scores": goal_scores
+            }
+        with phase('render'):
+            return render_template('goal_results.html', 
+                                 course_name=course_name,
+                                 target_grade=target_grade,
+                                 current_total=current_total,
+                                 goal_scores=goal_scores,
+                                 strategy=strategy,
+                                 config=config,
+                                 current_scores=schema.as_dict(current_scores))
+    
+    key = result_key('goal', course_name, schema.hash, current_scores, target_grade, strategy)
+    return cached_result(key, as_json, render, schema.hash)
+
+@app.route('/goal/curve', methods=['POST'])
+def goal_curve():
+    """Goal scores for every target grade at once, for sliders evaluated in the browser"""
+    data = request.json
+    course_name = data.get('course_name')
+    strategy = data.get('strategy', 'balanced')
+    
+    if strategy not in CURVE_STRATEGIES:
+        return jsonify({"error": f"Goal curves are available for: {', '.join(CURVE_STRATEGIES)}"}), 400
     
-    course = Course(course_name, categories, config['total_score'])
-    goal_scores = course.calculate_goal_scores(target_grade, current_scores_by_item, config)
+    config = get_course_config(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
+    
+    with phase('parse'):
+        schema = compile_schema(config)
+        current_scores = schema.parse(data)
     
-    current_total = course.total_achieved_score()
+    def render():
+        with phase('build'):
+            course = Course.from_schema(course_name, schema, current_scores)
+        with phase('compute'):
+            return course.goal_curve_from_array(current_scores, schema, strategy)
     
-    return render_template('goal_results.html', 
-                         course_name=course_name,
-                         target_grade=target_grade,
-                         current_total=current_total,
-                         goal_scores=goal_scores,
-                         config=config,
-                         current_scores=current_scores_by_item)
+    key = result_key('goal_curve', course_name, schema.hash, current_scores, strategy)
+    return cached_result(key, True, render, schema.hash)
 
 @app.route('/whatif', methods=['POST'])
 def calculate_whatif():
@@ -211,48 +472,215 @@ def calculate_whatif():
     data = request.json
     course_name = data.get('course_name')
     
-    all_courses = get_all_courses()
-    if course_name not in all_courses:
+    config = get_course_config(course_name)
+    if config is None:
         return jsonify({"error": "Course not found"}), 404
     
-    config = all_courses[course_name]
-    categories = []
-    current_scores_by_item = {}
-    hypothetical_scores = {}
+    with phase('parse'):
+        schema = compile_schema(config)
+        current_scores = schema.parse(data, prefix='current_')
+        hypothetical_scores = schema.parse_present(data, prefix='hypothetical_')
+        
+        # Overlay the hypothetical scores on the current ones
+        whatif_scores = list(current_scores)
+        for key, score in hypothetical_scores.items():
+            whatif_scores[schema.key_index[key]] = score
+    as_json = wants_json()
     
-    # Build current categories and track scores
-    for cat_config in config['categories']:
-        cat_name = cat_config['name']
-        scores = []
+    def render():
+        with phase('build'):
+            course = Course.from_schema(course_name, schema, current_scores)
+        with phase('compute'):
+            whatif_results = course.whatif_from_array(whatif_scores, schema)
         
-        for i in range(cat_config['item_count']):
-            key = f"{cat_name}_{i}"
-            score = data.get(f"current_{key}", data.get(key, 0))
-            try:
-                score_val = float(score) if score else 0
-                scores.append(score_val)
-                current_scores_by_item[key] = score
-            except (ValueError, TypeError):
-                scores.append(0)
-                current_scores_by_item[key] = 0
-            
-            # Check for hypothetical score
-            hyp_key = f"hypothetical_{key}"
-            if hyp_key in data:
-                try:
-                    hyp_val = float(data[hyp_key]) if data[hyp_key] else None
-                    if hyp_val is not None:
-                        hypothetical_scores[key] = hyp_val
-                except (ValueError, TypeError):
-                    pass
+        if as_json:
+            return {"results": whatif_results, "hypothetical_scores": hypothetical_scores}
+        with phase('render'):
+            fragments = None
+            if fragment_renderer is not None:
+                fragments = fragment_renderer.whatif_page(schema, whatif_results)
+            return render_template('whatif_results.html', results=whatif_results, hypothetical_scores=hypothetical_scores,
+                                   fragments=fragments)
+    
+    key = result_key('whatif', course_name, schema.hash, current_scores, hypothetical_scores)
+    return cached_result(key, as_json, render, schema.hash)
+
+@app.route('/whatif/grid', methods=['POST'])
+def whatif_grid_route():
+    """Final totals for every combination of scores on two or three items, for a heatmap"""
+    data = request.json
+    course_name = data.get('course_name')
+    
+    config = get_course_config(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
+    
+    with phase('parse'):
+        schema = compile_schema(config)
+        current_scores = schema.parse(data, prefix='current_')
+        hypothetical_scores = schema.parse_present(data, prefix='hypothetical_')
+        try:
+            axes = parse_axes(schema, data.get('axes'))
+        except (ValueError, TypeError, KeyError, OverflowError) as e:
+            return jsonify({"error": str(e)}), 400
         
-        category = Category(cat_name, scores, cat_config['max_score'])
-        categories.append(category)
+        # Items not on an axis keep their hypothetical or current score
+        whatif_scores = list(current_scores)
+        for key, score in hypothetical_scores.items():
+            whatif_scores[schema.key_index[key]] = score
     
-    course = Course(course_name, categories, config['total_score'])
-    whatif_results = course.calculate_whatif(hypothetical_scores, current_scores_by_item, config)
+    def render():
+        with phase('build'):
+            course = Course.from_schema(course_name, schema, current_scores)
+        with phase('compute'):
+            return whatif_grid(course_name, schema, whatif_scores, axes, course.total_achieved_score())
     
-    return render_template('whatif_results.html', results=whatif_results, hypothetical_scores=hypothetical_scores)
+    key = result_key('whatif_grid', course_name, schema.hash, whatif_scores, axes)
+    return cached_result(key, True, render, schema.hash)
+
+@app.route('/whatif/simulate', methods=['POST'])
+def simulate_whatif_route():
+    """Estimate the probability of reaching a target grade from past performance"""
+    data = request.json
+    course_name = data.get('course_name')
+    try:
+        target_grade = float(data.get('target_grade', 0))
+        n_scenarios = min(max(int(data.get('n_scenarios', 20000)), 1), MAX_SCENARIOS)
+    except (ValueError, TypeError, OverflowError):
+        return jsonify({"error": "target_grade and n_scenarios must be numbers"}), 400
+    seed = data.get('seed')
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        return jsonify({"error": "seed must be a non-negative integer"}), 400
+    
+    config = get_course_config(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
+    
+    # Blank or missing items are the ones still to be simulated
+    schema = compile_schema(config)
+    scores_by_item = {key: data.get(f"current_{key}", data.get(key)) for key in schema.keys}
+    
+    results = simulate_whatif(course_name, config, scores_by_item, target_grade, n_scenarios, seed)
+    return jsonify(results)
+
+@app.route('/cohort/<course_name>', methods=['GET'])
+def cohort_summary(course_name):
+    """Distribution of every category and the course total over all graded rosters"""
+    config, owner = get_course_and_owner(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
+    summary = get_cohort(course_name, compile_schema(config), owner).summary()
+    summary["course_name"] = course_name
+    return jsonify(summary)
+
+@app.route('/cohort/<course_name>/rank', methods=['GET'])
+def cohort_rank(course_name):
+    """Percentile and rank of ?total= within the cohort"""
+    config, owner = get_course_and_owner(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
+    total = request.args.get('total', type=float)
+    if total is None:
+        return jsonify({"error": "total is required"}), 400
+    return jsonify(get_cohort(course_name, compile_schema(config), owner).rank(total))
+
+@app.route('/cohort/<course_name>', methods=['DELETE'])
+def reset_cohort(course_name):
+    """Forget the cohort statistics of one of the user's own courses"""
+    config, owner = get_course_and_owner(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
+    # Predefined courses share one cohort between all users, so no single user may reset it
+    if owner is None:
+        return jsonify({"error": "Only the cohorts of your own courses can be reset"}), 403
+    drop_cohort(owner, course_name, config)
+    return jsonify({"success": True})
+
+@app.route('/session', methods=['POST'])
+def open_session():
+    """Open an incremental grading session with the full current scores"""
+    data = request.json
+    course_name = data.get('course_name')
+    
+    config = get_course_config(course_name)
+    if config is None:
+        return jsonify({"error": "Course not found"}), 404
+    
+    with phase('parse'):
+        schema = compile_schema(config)
+        scores = schema.parse(data)
+    with phase('build'):
+        grading_session = grading_sessions.add(GradingSession(course_name, schema, scores, get_user_id()))
+    return jsonify(grading_session.snapshot()), 201
+
+def get_grading_session(session_id):
+    return grading_sessions.get(session_id, get_user_id())
+
+@app.route('/session/<session_id>', methods=['GET'])
+def session_state(session_id):
+    """Full current state of a grading session"""
+    grading_session = get_grading_session(session_id)
+    if grading_session is None:
+        return jsonify({"error": "Session not found"}), 404
+    with grading_session.lock:
+        return jsonify(grading_session.snapshot())
+
+@app.route('/session/<session_id>', methods=['PATCH'])
+def update_session_scores(session_id):
+    """Apply changed scores, e.g. {"Homework_3": 4}; only the changed fields are returned"""
+    grading_session = get_grading_session(session_id)
+    if grading_session is None:
+        return jsonify({"error": "Session not found"}), 404
+    with phase('compute'), grading_session.lock:
+        try:
+            changes = grading_session.update_scores(request.json)
+        except KeyError as e:
+            return jsonify({"error": f"Unknown item: {e.args[0]}"}), 400
+        except TypeError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(changes)
+
+@app.route('/session/<session_id>/whatif', methods=['PATCH'])
+def update_session_whatif(session_id):
+    """Set hypothetical scores (null or blank clears one); only the changed fields are returned"""
+    grading_session = get_grading_session(session_id)
+    if grading_session is None:
+        return jsonify({"error": "Session not found"}), 404
+    with phase('compute'), grading_session.lock:
+        try:
+            changes = grading_session.update_whatif(request.json)
+        except KeyError as e:
+            return jsonify({"error": f"Unknown item: {e.args[0]}"}), 400
+        except TypeError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(changes)
+
+@app.route('/session/<session_id>/goal', methods=['PUT'])
+def set_session_goal(session_id):
+    """Open or change the goal view; later score updates return only the goal entries that change"""
+    grading_session = get_grading_session(session_id)
+    if grading_session is None:
+        return jsonify({"error": "Session not found"}), 404
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"error": "Send an object with target_grade and strategy"}), 400
+    strategy = data.get('strategy', 'balanced')
+    if strategy not in STRATEGIES:
+        return jsonify({"error": f"Unknown goal strategy: {strategy}"}), 400
+    try:
+        target_grade = float(data.get('target_grade', 0))
+    except (ValueError, TypeError):
+        return jsonify({"error": "target_grade must be a number"}), 400
+    with phase('compute'), grading_session.lock:
+        goal = grading_session.set_goal(target_grade, strategy)
+    return jsonify(goal)
+
+@app.route('/session/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    """Close a grading session"""
+    if grading_sessions.remove(session_id, get_user_id()):
+        return jsonify({"success": True})
+    return jsonify({"error": "Session not found"}), 404
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
@@ -0,0 +1,153 @@
+import numpy as np
+
+from schema import compile_schema
+
+
+def roster_matrix(schema, roster):
+    """
+    Load a roster into a (students x items) score matrix.
+
+    Args:
+        schema: Compiled CourseSchema of the course
+        roster: List of dicts with keys like "CategoryName_0", "CategoryName_1", etc.
+
+    Returns:
+        Fortran-ordered float64 matrix, one column per item in schema order
+    """
+    # Column-major so each item's scores are contiguous for the column sums
+    matrix = np.zeros((len(roster), len(schema)), order='F')
+    for row, scores in enumerate(roster):
+        matrix[row] = schema.parse(scores)
+    return matrix
+
+
+def kept_mask(block, keep):
+    """
+    Mark the scores that count when only the `keep` best of each row count.
+
+    Selects with numpy.partition instead of sorting each row, and resolves
+    ties like policies.dropped_items: among equal scores, earlier items are
+    dropped first.
+
+    Args:
+        block: (students x items) scores of one category
+        keep: Number of items that count
+
+    Returns:
+        Boolean array of the same shape, True where the score counts
+    """
+    n_items = block.shape[1]
+    drop = n_items - keep
+    # The highest dropped score in each row
+    threshold = np.partition(block, drop - 1, axis=1)[:, drop - 1:drop]
+    below = block < threshold
+    tied = block == threshold
+    # Of the items tied with the threshold, drop the earliest ones still needed
+    tied_to_drop = drop - below.sum(axis=1, keepdims=True)
+    dropped = below | (tied & (np.cumsum(tied, axis=1) <= tied_to_drop))
+    return ~dropped
+
+
+def policy_totals(block, keep=None, cap=None, out=None):
+    """
+    Points a category adds for every row of a (students x items) block: the
+    counted scores summed in item order (like policies.policy_total, so
+    results are bit-for-bit identical), then capped.
+    """
+    if out is None:
+        out = np.zeros(block.shape[0])
+    if keep is None or keep >= block.shape[1]:
+        for j in range(block.shape[1]):
+            out += block[:, j]
+    else:
+        counted = kept_mask(block, keep)
+        for j in range(block.shape[1]):
+            # Adding 0.0 for dropped items leaves the running sum unchanged
+            out += np.where(counted[:, j], block[:, j], 0.0)
+    if cap is not None:
+        np.minimum(out, cap, out=out)
+    return out
+
+
+def grade_matrix(schema, matrix):
+    """
+    Grade every student in a score matrix in a single vectorized pass.
+
+    Args:
+        schema: Compiled CourseSchema of the course
+        matrix: (students x items) scores in the column order of roster_matrix
+
+    Returns:
+        Dict of arrays: per-category "achieved" and "percentage" (students x
+        categories), plus "total_achieved" and "total_percentage" per student
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n_students = matrix.shape[0]
+    n_categories = len(schema.category_names)
+    achieved = np.zeros((n_students, n_categories))
+    percentage = np.zeros((n_students, n_categories))
+    total_achieved = np.zeros(n_students)
+
+    for c, max_score in enumerate(schema.category_max_scores):
+        # Accumulate item by item, matching the left-to-right order of sum() in
+        # Category.achieved_score so results are bit-for-bit identical
+        category_total = achieved[:, c]
+        start, stop = schema.offsets[c], schema.offsets[c + 1]
+        if schema.category_keeps[c] is None and schema.category_caps[c] is None:
+            for j in range(start, stop):
+                category_total += matrix[:, j]
+        else:
+            policy_totals(matrix[:, start:stop], schema.category_keeps[c], schema.category_caps[c], category_total)
+
+        if max_score != 0:
+            percentage[:, c] = (category_total / max_score) * 100
+        total_achieved += category_total
+
+    return {
+        "achieved": achieved,
+        "percentage": percentage,
+        "total_achieved": total_achieved,
+        "total_percentage": (total_achieved / schema.total_score) * 100
+    }
+
+
+def grade_roster(course_name, config, roster, cohort=None):
+    """
+    Grade a whole roster for one course.
+
+    Args:
+        course_name: Name of the course
+        config: Course configuration with category info
+        roster: List of dicts shaped like a /calculate payload, one per student
+        cohort: Optional cohort.CohortStats to add the graded students to
+
+    Returns:
+        List of results dicts, the same shape the /calculate route renders
+    """
+    schema = compile_schema(config)
+    graded = grade_matrix(schema, roster_matrix(schema, roster))
+    if cohort is not None:
+        cohort.add_graded(graded)
+
+    results = []
+    for row, scores in enumerate(roster):
+        student_results = {
+            "course_name": course_name,
+            "categories": [],
+            "total_achieved": float(graded["total_achieved"][row]),
+            "total_max": config['total_score'],
+            "total_percentage": float(graded["total_percentage"][row])
+        }
+        if 'student_id' in scores:
+            student_results["student_id"] = scores['student_id']
+
+        for c, name in enumerate(schema.category_names):
+            student_results["categories"].append({
+                "name": name,
+                "achieved": float(graded["achieved"][row, c]),
+                "max_score": schema.category_max_scores[c],
+                "percentage": float(graded["percentage"][row, c])
+            })
+        results.append(student_results)
+
+    return results
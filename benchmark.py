@@ -0,0 +1,257 @@
+"""
+Benchmarks for the grading core and the Flask routes.
+
+Courses, score payloads and rosters are generated synthetically, from a few
+items up to thousands of items and rosters of up to 100k students. Results
+are written as JSON; pass --compare with a saved run to flag regressions.
+
+Usage:
+    python benchmark.py -o baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.15
+    python benchmark.py --suite full --only goal
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from category import Category
+from course import Course
+from schema import compile_schema
+
+# (categories, items per category) shapes for each suite
+COURSE_SHAPES = {
+    'quick': [(3, 4), (10, 20), (20, 100)],
+    'full': [(3, 4), (10, 20), (20, 100), (100, 50), (1000, 5)],
+}
+ROSTER_SIZES = {
+    'quick': [1, 1000, 10000],
+    'full': [1, 1000, 10000, 100000],
+}
+
+
+def make_config(n_categories, items_per_category, total_score=100):
+    """Builds a course config with equally weighted categories"""
+    return {
+        'categories': [
+            {'name': f"Category{c}", 'item_count': items_per_category, 'max_score': total_score / n_categories}
+            for c in range(n_categories)
+        ],
+        'total_score': total_score
+    }
+
+
+def make_scores(config, graded=0.6, seed=0):
+    """Builds a score payload where roughly `graded` of the items have a score"""
+    rng = random.Random(seed)
+    scores = {}
+    for cat_config in config['categories']:
+        max_per_item = cat_config['max_score'] / cat_config['item_count']
+        for i in range(cat_config['item_count']):
+            if rng.random() < graded:
+                scores[f"{cat_config['name']}_{i}"] = str(round(rng.uniform(0.5, 1.0) * max_per_item, 2))
+    return scores
+
+
+def make_roster(config, n_students, seed=0):
+    return [make_scores(config, seed=seed + i) for i in range(n_students)]
+
+
+def measure(func, repeat=5, min_time=0.05):
+    """
+    Time func, calling it enough times per round to run for at least min_time.
+
+    Returns:
+        Dict with the median and minimum seconds per call
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    rounds = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    return {'median_s': statistics.median(rounds), 'min_s': min(rounds), 'number': number, 'repeat': repeat}
+
+
+def core_cases(suite):
+    """Yields (name, function) pairs timing Category and Course directly"""
+    for n_categories, items in COURSE_SHAPES[suite]:
+        shape = f"{n_categories}x{items}"
+        config = make_config(n_categories, items)
+        schema = compile_schema(config)
+        data = make_scores(config)
+        scores = schema.parse(data)
+        current = schema.as_dict(scores)
+        course = Course.from_schema('Bench', schema, scores)
+        target = course.total_achieved_score() + 10
+        hypothetical = {key: 1 for key in list(schema.keys)[::7]}
+        items_list = scores[:items]
+
+        yield f"category.build/{shape}", lambda: Category('c', items_list, 10)
+        yield f"category.achieved_percentage/{shape}", lambda: (
+            course.categories[0].achieved_score(), course.categories[0].percentage())
+        yield f"schema.parse/{shape}", lambda: schema.parse(data)
+        yield f"course.build/{shape}", lambda: Course.from_schema('Bench', schema, scores)
+        yield f"course.total/{shape}", course.total_achieved_score
+        for strategy in ('balanced', 'fewest', 'proportional'):
+            yield f"course.goal.{strategy}/{shape}", (
+                lambda strategy=strategy: course.calculate_goal_scores(target, current, config, strategy))
+        yield f"course.goal_curve/{shape}", lambda: course.goal_curve_from_array(scores, schema)
+        yield f"course.whatif/{shape}", lambda: course.calculate_whatif(hypothetical, current, config)
+
+
+def batch_cases(suite):
+    """Yields (name, function) pairs timing the vectorized roster engine"""
+    from batch import grade_matrix, roster_matrix
+
+    config = make_config(4, 10)
+    schema = compile_schema(config)
+    for n_students in ROSTER_SIZES[suite]:
+        roster = make_roster(config, n_students)
+        matrix = roster_matrix(schema, roster)
+        yield f"batch.parse/{n_students}", lambda roster=roster: roster_matrix(schema, roster)
+        yield f"batch.grade/{n_students}", lambda matrix=matrix: grade_matrix(schema, matrix)
+
+    # The same roster with every category dropping its two lowest scores
+    policy_config = make_config(4, 10)
+    for cat_config in policy_config['categories']:
+        cat_config['drop_lowest'] = 2
+    policy_schema = compile_schema(policy_config)
+    for n_students in ROSTER_SIZES[suite]:
+        matrix = roster_matrix(policy_schema, make_roster(policy_config, n_students))
+        yield f"batch.grade_drop_lowest/{n_students}", lambda matrix=matrix: grade_matrix(policy_schema, matrix)
+
+
+def route_cases(suite):
+    """Yields (name, function) pairs timing the Flask routes through the test client"""
+    # Keep benchmark courses out of the real course database
+    os.environ.setdefault('GRADE_CALCULATOR_DB', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    import app as app_module
+    from catalog import DictCatalog
+
+    # Benchmark courses are served from their own in-memory catalog, also when the
+    # app was configured with a catalog file
+    bench_configs = {}
+    app_module.course_catalog = DictCatalog(bench_configs)
+
+    client = app_module.app.test_client()
+    for n_categories, items in COURSE_SHAPES[suite]:
+        shape = f"{n_categories}x{items}"
+        course_name = f"Bench {shape}"
+        config = make_config(n_categories, items)
+        bench_configs[course_name] = config
+        data = dict(make_scores(config), course_name=course_name, target_grade='90')
+        whatif = dict(data, **{f"hypothetical_{key}": '1' for key in list(compile_schema(config).keys)[::7]})
+
+        def post(path, payload):
+            # Measure the computation, not the result cache
+            app_module.result_cache.clear()
+            response = client.post(path, json=payload)
+            assert response.status_code == 200, response.status_code
+
+        yield f"route.calculate/{shape}", lambda data=data: post('/calculate', data)
+        yield f"route.goal/{shape}", lambda data=data: post('/goal', data)
+        yield f"route.whatif/{shape}", lambda whatif=whatif: post('/whatif', whatif)
+
+        session_id = client.post('/session', json=data).json['session_id']
+        first_key = compile_schema(config).keys[0]
+        yield f"route.session_update/{shape}", lambda session_id=session_id, key=first_key: client.patch(
+            f'/session/{session_id}', json={key: random.uniform(0, 1)})
+
+
+GROUPS = {'core': core_cases, 'batch': batch_cases, 'routes': route_cases}
+
+
+def run(suite='quick', groups=None, only=None, repeat=5, min_time=0.05, log=sys.stderr):
+    """Runs the benchmarks and returns the JSON-serializable report"""
+    results = {}
+    for group in groups or GROUPS:
+        for name, func in GROUPS[group](suite):
+            if only and only not in name:
+                continue
+            results[name] = measure(func, repeat, min_time)
+            if log:
+                print(f"{name:45s} {results[name]['median_s'] * 1e6:12.2f} us", file=log)
+
+    return {
+        'meta': {
+            'suite': suite,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results
+    }
+
+
+def compare(report, baseline, threshold=0.10):
+    """
+    Compare a report against a baseline run.
+
+    Returns:
+        List of (name, baseline seconds, current seconds, relative change)
+        for benchmarks that got slower by more than threshold
+    """
+    regressions = []
+    for name, current in report['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['median_s']
+        change = (current['median_s'] - before) / before if before else 0
+        if change > threshold:
+            regressions.append((name, before, current['median_s'], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the grading core and Flask routes")
+    parser.add_argument('--suite', choices=sorted(COURSE_SHAPES), default='quick')
+    parser.add_argument('--group', action='append', choices=sorted(GROUPS),
+                        help="Only run these groups (default: all)")
+    parser.add_argument('--only', help="Only run benchmarks whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help="Minimum seconds per timing round")
+    parser.add_argument('--output', '-o', help="Write the JSON report here (default: stdout)")
+    parser.add_argument('--compare', help="Baseline JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative slowdown that counts as a regression (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    report = run(args.suite, args.group, args.only, args.repeat, args.min_time)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {before * 1e6:.2f} us -> {after * 1e6:.2f} us (+{change:.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
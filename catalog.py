@@ -0,0 +1,177 @@
+"""
+Catalogs of predefined course templates.
+
+A catalog answers three questions without materializing every course: the
+config of one course, a page of course names matching a search, and how many
+names match. DictCatalog serves the small predefined_courses.py dict;
+SQLiteCatalog serves catalogs with tens of thousands of courses from an
+indexed database file built with build_catalog.
+
+Command line usage:
+    python catalog.py catalog.db courses.json
+    python catalog.py catalog.db            # from predefined_courses.py
+"""
+import argparse
+import json
+import sqlite3
+import threading
+
+PREFIX = 'prefix'
+SUBSTRING = 'substring'
+
+
+def _sort_key(name):
+    return name.casefold()
+
+
+class CourseCatalog:
+    """Interface every catalog backend implements"""
+
+    def get(self, name):
+        """Returns the config of one course, or None"""
+        raise NotImplementedError
+
+    def search(self, query='', offset=0, limit=50, match=SUBSTRING):
+        """
+        Returns a page of course names.
+
+        Args:
+            query: Text to look for, ignoring case; empty matches every course
+            offset: Number of matching names to skip
+            limit: Maximum number of names to return
+            match: "substring" or "prefix"
+        """
+        raise NotImplementedError
+
+    def count(self, query='', match=SUBSTRING):
+        """Returns how many course names match the query"""
+        raise NotImplementedError
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+
+class DictCatalog(CourseCatalog):
+    """Catalog over an in-memory dict of course name -> config, in insertion order"""
+
+    def __init__(self, configs):
+        self.configs = configs
+
+    def get(self, name):
+        return self.configs.get(name)
+
+    def _matches(self, query, match):
+        query = _sort_key(query)
+        for name in self.configs:
+            key = _sort_key(name)
+            if key.startswith(query) if match == PREFIX else query in key:
+                yield name
+
+    def search(self, query='', offset=0, limit=50, match=SUBSTRING):
+        names = []
+        for index, name in enumerate(self._matches(query, match)):
+            if index >= offset + limit:
+                break
+            if index >= offset:
+                names.append(name)
+        return names
+
+    def count(self, query='', match=SUBSTRING):
+        return sum(1 for _ in self._matches(query, match))
+
+
+class SQLiteCatalog(CourseCatalog):
+    """
+    Read-only catalog in an SQLite file.
+
+    Names are ordered and searched by their case-folded form, which has its
+    own index: prefix searches are index range scans, substring searches scan
+    only the index, and configs are parsed one at a time when looked up.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def get(self, name):
+        row = self._connection().execute("SELECT config FROM catalog WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _where(self, query, match):
+        query = _sort_key(query)
+        if not query:
+            return "", ()
+        if match == PREFIX:
+            # Every key starting with query sorts between query and query + U+10FFFF
+            return "WHERE sort_key >= ? AND sort_key < ?", (query, query + '\U0010ffff')
+        return "WHERE instr(sort_key, ?) > 0", (query,)
+
+    def search(self, query='', offset=0, limit=50, match=SUBSTRING):
+        where, params = self._where(query, match)
+        rows = self._connection().execute(
+            f"SELECT name FROM catalog {where} ORDER BY sort_key, name LIMIT ? OFFSET ?",
+            params + (limit, offset)
+        ).fetchall()
+        return [name for (name,) in rows]
+
+    def count(self, query='', match=SUBSTRING):
+        where, params = self._where(query, match)
+        return self._connection().execute(f"SELECT count(*) FROM catalog {where}", params).fetchone()[0]
+
+
+def build_catalog(path, configs):
+    """
+    Write a catalog database from course configs.
+
+    Args:
+        path: SQLite file to create or replace the catalog in
+        configs: Dict of course name -> config, or an iterable of (name, config) pairs
+    """
+    if isinstance(configs, dict):
+        configs = configs.items()
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS catalog")
+            conn.execute("""
+                CREATE TABLE catalog (
+                    name TEXT PRIMARY KEY,
+                    sort_key TEXT NOT NULL,
+                    config TEXT NOT NULL
+                )
+            """)
+            conn.executemany(
+                "INSERT OR REPLACE INTO catalog (name, sort_key, config) VALUES (?, ?, ?)",
+                ((name, _sort_key(name), json.dumps(config)) for name, config in configs)
+            )
+            conn.execute("CREATE INDEX catalog_sort_key ON catalog (sort_key, name)")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an indexed course catalog database")
+    parser.add_argument('output', help="SQLite file to write")
+    parser.add_argument('configs', nargs='?', help="JSON file with a dict of course name -> config "
+                                                   "(default: predefined_courses.py)")
+    args = parser.parse_args(argv)
+
+    if args.configs:
+        with open(args.configs) as f:
+            configs = json.load(f)
+    else:
+        from predefined_courses import COURSE_CONFIGS as configs
+    build_catalog(args.output, configs)
+    print(f"Wrote {len(configs)} courses to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
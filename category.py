@@ -1,13 +1,55 @@
+from array import array
+
+from policies import policy_total
+
+
 class Category:
-    def __init__(self, name, items, max_score):
+    __slots__ = ('name', 'max_score', 'keep', 'cap', '_items', '_total', '_achieved')
+
+    def __init__(self, name, items, max_score, keep=None, cap=None):
         self.name = name
-        self.items = items  # array of scores achieved
         self.max_score = max_score  # maximum possible score for this category
-        
+        self.keep = keep  # number of best items that count (None: all of them)
+        self.cap = cap  # most points the category can add (None: no cap)
+        self.items = items  # array of scores achieved
+
+    @property
+    def items(self):
+        """The scores achieved, stored as a compact array of doubles"""
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        self._items = array('d', items)
+        self._total = sum(self._items)
+        self._achieved = None
+
+    def set_item(self, index, score):
+        """
+        Updates a single score and adjusts the running total in O(1). After
+        many updates the total may differ from a fresh sum in the last bits.
+        """
+        previous = self._items[index]
+        self._items[index] = score
+        self._total += score - previous
+        self._achieved = None
+
+    def scores_view(self):
+        """Returns a zero-copy memoryview of the scores (usable with numpy.frombuffer)"""
+        return memoryview(self._items)
+
     def achieved_score(self):
         """Returns the total score achieved in this category"""
-        return sum(self.items)
-    
+        if self.keep is None and self.cap is None:
+            return self._total
+        # Dropped items and caps need a selection, done once per change
+        if self._achieved is None:
+            if self.keep is None:
+                self._achieved = min(self._total, self.cap)
+            else:
+                self._achieved = policy_total(self._items, self.keep, self.cap)
+        return self._achieved
+
     def percentage(self):
         """Returns the percentage achieved in this category (0-100)"""
         if self.max_score == 0:
@@ -0,0 +1,179 @@
+"""
+Headless JSON-lines grade calculator.
+
+Reads one JSON request per line on stdin and writes one JSON result per line
+to stdout, in input order. Requests carry the same fields as the JSON API,
+plus the operation and an optional ID that is echoed back:
+
+    {"op": "calculate", "id": 1, "course_name": "Analysis", "Homework_0": 4, ...}
+    {"op": "goal", "course_name": "Analysis", "target_grade": 90, "strategy": "fewest", ...}
+    {"op": "whatif", "course_name": "Analysis", "current_Final_0": 0, "hypothetical_Final_0": 30}
+
+Instead of course_name a request may carry its own "config". Results are
+the /calculate, /goal and /whatif JSON responses; a request that fails gives
+{"id": ..., "error": "..."} and the remaining lines are still processed.
+
+Only the pure-Python grading core is imported (no Flask, no numpy), so the
+tool starts in a few tens of milliseconds and can run as a worker in shell
+pipelines.
+
+Command line usage:
+    python cli.py --config courses.json < requests.jsonl > results.jsonl
+    python cli.py --course Analysis --op goal --line-buffered
+"""
+import argparse
+import json
+import sys
+
+from course import Course
+from goal_solver import STRATEGIES
+from schema import compile_schema
+
+OPERATIONS = ('calculate', 'goal', 'whatif')
+
+
+def config_finder(config_path=None, catalog_path=None):
+    """
+    Returns a function that looks up a course config by name, or None.
+
+    The config file holds either a single course config, used for every
+    request, or a dict of course name -> config; a catalog is a SQLite file
+    built by catalog.py. Without either, predefined_courses.py is used when
+    it exists.
+    """
+    if catalog_path:
+        from catalog import SQLiteCatalog
+        return SQLiteCatalog(catalog_path).get
+    if config_path:
+        with open(config_path) as f:
+            configs = json.load(f)
+        if 'categories' in configs:
+            return lambda course_name: configs
+        return configs.get
+    try:
+        from predefined_courses import COURSE_CONFIGS
+        return COURSE_CONFIGS.get
+    except ImportError:
+        return lambda course_name: None
+
+
+def calculate(course_name, schema, data):
+    """Same result as the /calculate JSON response"""
+    return Course.from_schema(course_name, schema, schema.parse(data)).results()
+
+
+def goal(course_name, schema, data):
+    """Same result as the /goal JSON response"""
+    target_grade = float(data.get('target_grade', 0))
+    strategy = data.get('strategy', 'balanced')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown goal strategy: {strategy}")
+    current_scores = schema.parse(data)
+    course = Course.from_schema(course_name, schema, current_scores)
+    return {
+        "course_name": course_name,
+        "target_grade": target_grade,
+        "strategy": strategy,
+        "current_total": course.total_achieved_score(),
+        "goal_scores": course.goal_scores_from_array(target_grade, current_scores, schema, strategy)
+    }
+
+
+def whatif(course_name, schema, data):
+    """Same result as the /whatif JSON response"""
+    current_scores = schema.parse(data, prefix='current_')
+    hypothetical_scores = schema.parse_present(data, prefix='hypothetical_')
+    whatif_scores = list(current_scores)
+    for key, score in hypothetical_scores.items():
+        whatif_scores[schema.key_index[key]] = score
+    course = Course.from_schema(course_name, schema, current_scores)
+    return {"results": course.whatif_from_array(whatif_scores, schema), "hypothetical_scores": hypothetical_scores}
+
+
+HANDLERS = {'calculate': calculate, 'goal': goal, 'whatif': whatif}
+
+
+def handle(data, find_config, default_op='calculate', default_course=None):
+    """
+    Answer one request.
+
+    Returns:
+        The result dict
+
+    Raises:
+        ValueError: For unknown operations or courses and invalid requests
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Each request must be a JSON object")
+    op = data.get('op', default_op)
+    if op not in HANDLERS:
+        raise ValueError(f"Unknown operation: {op}; use one of: {', '.join(OPERATIONS)}")
+    course_name = data.get('course_name', default_course)
+    config = data.get('config')
+    if config is None:
+        config = find_config(course_name)
+        if config is None:
+            raise ValueError(f"Course not found: {course_name}")
+    # compile_schema caches by config hash, so repeated courses are compiled once
+    return HANDLERS[op](course_name, compile_schema(config), data)
+
+
+def run(source, target, find_config, default_op='calculate', default_course=None, line_buffered=False):
+    """
+    Answer every request line of source, writing a result line to target.
+
+    Returns:
+        Number of requests that failed
+    """
+    failed = 0
+    for line in iter(source.readline, ''):
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            data = json.loads(line)
+            if isinstance(data, dict):
+                request_id = data.get('id')
+            result = handle(data, find_config, default_op, default_course)
+        except (ValueError, KeyError, TypeError, ZeroDivisionError) as e:
+            failed += 1
+            result = {"error": str(e)}
+        if request_id is not None:
+            result = dict(id=request_id, **result)
+        target.write(json.dumps(result) + '\n')
+        if line_buffered:
+            target.flush()
+    target.flush()
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer calculate, goal and what-if requests given as JSON lines")
+    parser.add_argument('input', nargs='?', default='-', help="JSON-lines request file, or - for stdin (default)")
+    parser.add_argument('--config', help="JSON file with a course config (or a dict of them)")
+    parser.add_argument('--catalog', help="SQLite course catalog built by catalog.py")
+    parser.add_argument('--course', help="Course for requests without a course_name")
+    parser.add_argument('--op', choices=OPERATIONS, default='calculate', help="Operation for requests without an op")
+    parser.add_argument('--output', '-o', help="Output file (default: stdout)")
+    parser.add_argument('--line-buffered', action='store_true',
+                        help="Flush after every result, for driving the tool as a coprocess")
+    args = parser.parse_args(argv)
+
+    find_config = config_finder(args.config, args.catalog)
+    source = sys.stdin if args.input == '-' else open(args.input)
+    target = sys.stdout if not args.output else open(args.output, 'w')
+    try:
+        failed = run(source, target, find_config, args.op, args.course, args.line_buffered)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    if failed:
+        print(f"{failed} request(s) failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
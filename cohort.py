@@ -0,0 +1,266 @@
+"""
+Streaming cohort statistics.
+
+Graded students are fed in batches (straight from batch.grade_matrix results)
+and summarized in bounded memory: every category percentage and the course
+total keep a t-digest for percentiles and ranks, a fixed-bin histogram and
+running moments. However many students have been added, a summary or a rank
+query only looks at the digest's few hundred centroids.
+
+Command line usage:
+    python cohort.py roster.csv --config course.json --course Analysis
+    python cohort.py term.gcol --rank 83.5
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+
+import numpy as np
+
+from simulation import PERCENTILES
+
+COMPRESSION = 200
+BINS = 20
+
+
+class TDigest:
+    """
+    Merging t-digest: a sorted set of weighted centroids whose sizes shrink
+    towards the tails, giving accurate extreme percentiles in O(compression)
+    memory.
+    """
+
+    def __init__(self, compression=COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        self._buffer.append(values)
+        self._buffered += len(values)
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self._buffered >= 10 * self.compression:
+            self._merge()
+
+    def _merge(self):
+        """Fold the buffered values into the centroids"""
+        if not self._buffer:
+            return
+        means = np.concatenate([self.means] + self._buffer)
+        weights = np.concatenate([self.weights, np.ones(self._buffered)])
+        self._buffer = []
+        self._buffered = 0
+
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        # Group neighbours that fall in the same unit of the arcsine scale
+        # function k(q) = compression / pi * asin(2q - 1), so centroids near the
+        # median hold many values and those in the tails only a few; this
+        # leaves about `compression` centroids
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / math.pi * np.arcsin(np.clip(2 * q - 1, -1, 1))
+        groups = np.floor(k - k[0]).astype(np.int64)
+        merged_weights = np.bincount(groups, weights)
+        keep = merged_weights > 0
+        self.means = (np.bincount(groups, weights * means)[keep] / merged_weights[keep])
+        self.weights = merged_weights[keep]
+
+    def _curve(self):
+        """Cumulative weight at each centroid centre, padded with the extremes"""
+        self._merge()
+        centres = np.cumsum(self.weights) - self.weights / 2
+        return (np.concatenate(([self.min], self.means, [self.max])),
+                np.concatenate(([0.0], centres, [float(self.count)])))
+
+    def quantile(self, q):
+        """Value below which a fraction q of the values lie"""
+        if not self.count:
+            return math.nan
+        values, ranks = self._curve()
+        return float(np.interp(q * self.count, ranks, values))
+
+    def cdf(self, value):
+        """Fraction of the values at or below value"""
+        if not self.count:
+            return math.nan
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        values, ranks = self._curve()
+        return float(np.interp(value, values, ranks)) / self.count
+
+
+class Distribution:
+    """One metric: a t-digest, a fixed-bin histogram over [low, high] and running moments"""
+
+    def __init__(self, low, high, bins=BINS, compression=COMPRESSION):
+        self.digest = TDigest(compression)
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    @property
+    def count(self):
+        return self.digest.count
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        n = len(values)
+        if not n:
+            return
+        # Chan et al.: combine the batch's mean and variance with the running ones
+        previous = self.count
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        delta = batch_mean - self.mean
+        total = previous + n
+        self.mean += delta * n / total
+        self._m2 += batch_m2 + delta * delta * previous * n / total
+
+        self.digest.update(values)
+        self.counts += np.histogram(values, bins=self.edges)[0]
+        self.below += int((values < self.edges[0]).sum())
+        self.above += int((values > self.edges[-1]).sum())
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": math.sqrt(self._m2 / self.count),
+            "min": self.digest.min,
+            "max": self.digest.max,
+            "percentiles": {str(p): self.digest.quantile(p / 100) for p in PERCENTILES},
+            "histogram": {"edges": self.edges.tolist(), "counts": self.counts.tolist(),
+                          "below": self.below, "above": self.above}
+        }
+
+
+class CohortStats:
+    """
+    Distributions of every category percentage and of the course total for
+    one course. Thread-safe.
+    """
+
+    def __init__(self, schema, bins=BINS, compression=COMPRESSION):
+        self.schema = schema
+        self.categories = [Distribution(0, 100, bins, compression) for _ in schema.category_names]
+        self.total = Distribution(0, schema.total_score, bins, compression)
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return self.total.count
+
+    def add_graded(self, graded):
+        """Add every student of a batch.grade_matrix result"""
+        with self._lock:
+            for c, distribution in enumerate(self.categories):
+                distribution.update(graded["percentage"][:, c])
+            self.total.update(graded["total_achieved"])
+
+    def add_results(self, results):
+        """Add /calculate-shaped result dicts"""
+        results = list(results)
+        if not results:
+            return
+        self.add_graded({
+            "percentage": np.array([[category["percentage"] for category in result["categories"]]
+                                    for result in results]),
+            "total_achieved": np.array([result["total_achieved"] for result in results])
+        })
+
+    def summary(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_max": self.schema.total_score,
+                "total": self.total.summary(),
+                "categories": {name: distribution.summary()
+                               for name, distribution in zip(self.schema.category_names, self.categories)}
+            }
+
+    def rank(self, total_achieved):
+        """
+        Where a course total stands in the cohort.
+
+        Returns:
+            Dict with the percentile (share of the cohort at or below the
+            total) and the approximate rank, 1 being the best
+        """
+        with self._lock:
+            count = self.count
+            if not count:
+                return {"total_achieved": total_achieved, "count": 0}
+            below_or_equal = self.total.digest.cdf(total_achieved)
+        return {
+            "total_achieved": total_achieved,
+            "count": count,
+            "percentile": below_or_equal * 100,
+            "rank": int(round((1 - below_or_equal) * count)) + 1
+        }
+
+
+def main(argv=None):
+    from gradebook import RowMapper, chunked, guess_format, load_config, read_rows
+    from batch import grade_matrix
+    from columnar import ColumnarGradebook
+    from schema import compile_schema
+
+    parser = argparse.ArgumentParser(description="Cohort statistics for a gradebook")
+    parser.add_argument('input', help="CSV or JSON-lines gradebook, a columnar gradebook directory, or - for stdin")
+    parser.add_argument('--config', help="JSON file with a course config (or a dict of them)")
+    parser.add_argument('--course', help="Course name in the config file or predefined courses")
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="Input format (default: from the file name)")
+    parser.add_argument('--bins', type=int, default=BINS)
+    parser.add_argument('--rank', type=float, action='append', default=[], metavar='TOTAL',
+                        help="Also report where this course total ranks")
+    args = parser.parse_args(argv)
+
+    if args.input != '-' and os.path.isdir(args.input):
+        gradebook = ColumnarGradebook(args.input)
+        cohort = CohortStats(gradebook.schema, args.bins)
+        for _, graded in gradebook.grade_blocks():
+            cohort.add_graded(graded)
+    else:
+        schema = compile_schema(load_config(args.config, args.course))
+        cohort = CohortStats(schema, args.bins)
+        fmt = args.format or guess_format(args.input)
+        source = sys.stdin if args.input == '-' else open(args.input, newline='')
+        try:
+            mapper = RowMapper(schema)
+            for chunk in chunked(read_rows(source, fmt)):
+                matrix, _ = mapper.parse(chunk)
+                cohort.add_graded(grade_matrix(schema, matrix))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+    report = cohort.summary()
+    if args.rank:
+        report["ranks"] = [cohort.rank(total) for total in args.rank]
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
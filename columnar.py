@@ -0,0 +1,269 @@
+"""
+Columnar, memory-mapped gradebooks.
+
+A columnar gradebook is a directory holding:
+
+    header.json  the course config, item keys, dtype, block size and row count
+    scores.bin   float32 or float64 scores in blocks of block_rows students;
+                 inside a block each item's scores are contiguous
+    ids.bin      fixed-width UTF-8 student IDs, one per row
+
+scores.bin is opened with numpy.memmap, so each block is a zero-copy
+(students x items) view with contiguous columns, which is the layout
+batch.grade_matrix sums over. Appending fills the last block and grows the
+file a block at a time; the row count in header.json is updated last, so
+readers never see a half-written row. One writer at a time is assumed.
+
+Command line usage:
+    python columnar.py import roster.csv term.gcol --config course.json --course Analysis
+    python columnar.py import more.csv term.gcol
+    python columnar.py grade term.gcol --output-format jsonl > graded.jsonl
+    python columnar.py info term.gcol
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from batch import grade_matrix
+from schema import compile_schema, config_hash
+
+FORMAT = 'grade-calculator-columnar'
+VERSION = 1
+BLOCK_ROWS = 65536
+ID_WIDTH = 32
+DTYPES = ('float32', 'float64')
+
+
+class ColumnarGradebook:
+    """A gradebook directory opened for reading and appending"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as f:
+            self.header = json.load(f)
+        if self.header.get('format') != FORMAT or self.header.get('version') != VERSION:
+            raise ValueError(f"Not a version {VERSION} columnar gradebook: {path}")
+        self.config = self.header['config']
+        self.schema = compile_schema(self.config)
+        self.dtype = np.dtype(self.header['dtype'])
+        self.block_rows = self.header['block_rows']
+        self.id_dtype = np.dtype(f"S{self.header['id_width']}")
+        self._scores = None
+        self._ids = None
+
+    @classmethod
+    def create(cls, path, config, dtype='float64', block_rows=BLOCK_ROWS, id_width=ID_WIDTH):
+        """Create an empty gradebook directory for a course config"""
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of: {', '.join(DTYPES)}")
+        os.makedirs(path)
+        schema = compile_schema(config)
+        open(os.path.join(path, 'scores.bin'), 'wb').close()
+        open(os.path.join(path, 'ids.bin'), 'wb').close()
+        _write_header(path, {
+            'format': FORMAT,
+            'version': VERSION,
+            'dtype': dtype,
+            'block_rows': block_rows,
+            'id_width': id_width,
+            'rows': 0,
+            'config': config,
+            'config_hash': schema.hash,
+            'keys': schema.keys
+        })
+        return cls(path)
+
+    def __len__(self):
+        return self.header['rows']
+
+    @property
+    def n_blocks(self):
+        return -(-len(self) // self.block_rows)
+
+    def _map(self):
+        """Memory-map the stored blocks; remapped after appends grow the files"""
+        if self._scores is None:
+            size = os.path.getsize(os.path.join(self.path, 'scores.bin'))
+            stored_blocks = size // (self.dtype.itemsize * len(self.schema) * self.block_rows)
+            if stored_blocks and len(self.schema):
+                self._scores = np.memmap(os.path.join(self.path, 'scores.bin'), dtype=self.dtype, mode='r',
+                                         shape=(stored_blocks, len(self.schema), self.block_rows))
+            if len(self):
+                self._ids = np.memmap(os.path.join(self.path, 'ids.bin'), dtype=self.id_dtype, mode='r',
+                                      shape=(len(self),))
+        return self._scores, self._ids
+
+    def block(self, b):
+        """
+        Returns (scores, ids) of block b: a zero-copy (students x items) view
+        whose columns are contiguous, and the raw student IDs
+        """
+        scores, ids = self._map()
+        start = b * self.block_rows
+        rows = min(self.block_rows, len(self) - start)
+        if scores is None:
+            matrix = np.zeros((rows, len(self.schema)), dtype=self.dtype)
+        else:
+            matrix = scores[b, :, :rows].T
+        return matrix, ids[start:start + rows]
+
+    def blocks(self):
+        """Yield (scores, ids) for every block in row order"""
+        for b in range(self.n_blocks):
+            yield self.block(b)
+
+    def column(self, key):
+        """Yield the scores of one item, a contiguous view per block"""
+        index = self.schema.key_index[key]
+        for matrix, _ in self.blocks():
+            yield matrix[:, index]
+
+    def decode_ids(self, ids):
+        """Student IDs of a block as strings"""
+        return [raw.decode('utf-8') for raw in ids]
+
+    def append(self, matrix, student_ids=None):
+        """
+        Append students.
+
+        Args:
+            matrix: (students x items) scores in schema item order
+            student_ids: Optional list of IDs (at most id_width UTF-8 bytes each)
+        """
+        matrix = np.asarray(matrix, dtype=self.dtype)
+        if matrix.ndim != 2 or matrix.shape[1] != len(self.schema):
+            raise ValueError(f"Expected a (students x {len(self.schema)}) matrix")
+        n = matrix.shape[0]
+        if n == 0:
+            return
+        encoded = [str(value if value is not None else '').encode('utf-8')
+                   for value in (student_ids if student_ids is not None else [''] * n)]
+        if len(encoded) != n:
+            raise ValueError("Need one student ID per row")
+        if any(len(value) > self.id_dtype.itemsize for value in encoded):
+            raise ValueError(f"Student IDs are limited to {self.id_dtype.itemsize} bytes")
+
+        start = len(self)
+        blocks_needed = -(-(start + n) // self.block_rows)
+        block_bytes = self.dtype.itemsize * len(self.schema) * self.block_rows
+        scores_path = os.path.join(self.path, 'scores.bin')
+        if len(self.schema):
+            with open(scores_path, 'r+b') as f:
+                if os.path.getsize(scores_path) < blocks_needed * block_bytes:
+                    f.truncate(blocks_needed * block_bytes)
+            scores = np.memmap(scores_path, dtype=self.dtype, mode='r+',
+                               shape=(blocks_needed, len(self.schema), self.block_rows))
+            row = 0
+            while row < n:
+                b, offset = divmod(start + row, self.block_rows)
+                count = min(self.block_rows - offset, n - row)
+                scores[b, :, offset:offset + count] = matrix[row:row + count].T
+                row += count
+            scores.flush()
+            del scores
+
+        with open(os.path.join(self.path, 'ids.bin'), 'r+b') as f:
+            f.seek(start * self.id_dtype.itemsize)
+            f.write(np.array(encoded, dtype=self.id_dtype).tobytes())
+
+        # Publish the new rows last
+        self.header['rows'] = start + n
+        _write_header(self.path, self.header)
+        self._scores = self._ids = None
+
+    def grade_blocks(self):
+        """Yield (student IDs, grade_matrix result) per block, reading the scores in place"""
+        for matrix, ids in self.blocks():
+            yield self.decode_ids(ids), grade_matrix(self.schema, matrix)
+
+
+def _write_header(path, header):
+    tmp = os.path.join(path, 'header.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(header, f)
+    os.replace(tmp, os.path.join(path, 'header.json'))
+
+
+def import_rows(gradebook, rows, mapping=None, id_column=None, chunk_size=10000):
+    """
+    Append gradebook rows (dicts, e.g. from gradebook.read_rows) to a columnar gradebook.
+
+    Returns:
+        Number of rows appended
+    """
+    from gradebook import RowMapper, chunked
+
+    mapper = RowMapper(gradebook.schema, mapping, id_column)
+    count = 0
+    for chunk in chunked(rows, chunk_size):
+        gradebook.append(*mapper.parse(chunk))
+        count += len(chunk)
+    return count
+
+
+def main(argv=None):
+    from gradebook import FORMATS, export, graded_records, guess_format, load_config, read_rows
+
+    parser = argparse.ArgumentParser(description="Columnar, memory-mapped gradebooks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="Append a CSV or JSON-lines gradebook, creating the store")
+    import_parser.add_argument('input', help="Gradebook file, or - for stdin")
+    import_parser.add_argument('store', help="Columnar gradebook directory")
+    import_parser.add_argument('--config', help="JSON file with a course config (or a dict of them)")
+    import_parser.add_argument('--course', help="Course name in the config file or predefined courses")
+    import_parser.add_argument('--format', choices=FORMATS, help="Input format (default: from the file name)")
+    import_parser.add_argument('--dtype', choices=DTYPES, default='float64')
+    import_parser.add_argument('--map', action='append', default=[], metavar='COLUMN=ITEM_KEY')
+    import_parser.add_argument('--id-column', help="Column identifying students")
+
+    grade_parser = commands.add_parser('grade', help="Grade every student in a columnar gradebook")
+    grade_parser.add_argument('store', help="Columnar gradebook directory")
+    grade_parser.add_argument('--output-format', choices=FORMATS, default='csv')
+
+    info_parser = commands.add_parser('info', help="Describe a columnar gradebook")
+    info_parser.add_argument('store', help="Columnar gradebook directory")
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        if os.path.exists(args.store):
+            gradebook = ColumnarGradebook(args.store)
+            if args.config or args.course:
+                config = load_config(args.config, args.course)
+                if config_hash(config) != gradebook.header['config_hash']:
+                    raise SystemExit("The course config differs from the one the gradebook was created with")
+        else:
+            gradebook = ColumnarGradebook.create(args.store, load_config(args.config, args.course), args.dtype)
+        fmt = args.format or guess_format(args.input)
+        source = sys.stdin if args.input == '-' else open(args.input, newline='')
+        try:
+            mapping = dict(item.rsplit('=', 1) for item in args.map)
+            count = import_rows(gradebook, read_rows(source, fmt), mapping, args.id_column)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        print(f"Appended {count} students, {len(gradebook)} in total", file=sys.stderr)
+
+    elif args.command == 'grade':
+        gradebook = ColumnarGradebook(args.store)
+        records = (record for ids, graded in gradebook.grade_blocks()
+                   for record in graded_records(gradebook.schema, graded, ids))
+        for text in export(records, args.output_format):
+            sys.stdout.write(text)
+
+    else:
+        gradebook = ColumnarGradebook(args.store)
+        print(json.dumps({
+            'rows': len(gradebook),
+            'items': len(gradebook.schema),
+            'dtype': gradebook.header['dtype'],
+            'block_rows': gradebook.block_rows,
+            'config_hash': gradebook.header['config_hash']
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
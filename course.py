@@ -1,4 +1,7 @@
 from category import Category
+from goal_solver import goal_curve, solve_goal
+from policies import goal_ceilings
+from schema import compile_schema
 import math
 
 class Course:
@@ -25,103 +28,111 @@ class Course:
         print(f"Total Score: {total_achieved:.2f}/{self.total_score} ({total_percentage:.2f}%)")
         print("=" * 40)
     
-    def calculate_goal_scores(self, target_grade, current_scores_by_item, config):
+    def results(self):
+        """
+        Returns the calculation results: every category's points and
+        percentage plus the course total
+        """
+        total_achieved = self.total_achieved_score()
+        return {
+            "course_name": self.name,
+            "categories": [
+                {
+                    "name": category.name,
+                    "achieved": category.achieved_score(),
+                    "max_score": category.max_score,
+                    "percentage": category.percentage()
+                }
+                for category in self.categories
+            ],
+            "total_achieved": total_achieved,
+            "total_max": self.total_score,
+            "total_percentage": (total_achieved / self.total_score) * 100
+        }
+    
+    @classmethod
+    def from_schema(cls, name, schema, scores):
+        """Builds a course from a compiled schema and flat scores in item order"""
+        return cls(name, schema.categories(scores), schema.total_score)
+    
+    def calculate_goal_scores(self, target_grade, current_scores_by_item, config, strategy='balanced'):
         """
         Calculate minimum goal scores for remaining items to achieve target grade.
-        Favors most distributed approach across categories.
         
         Args:
             target_grade: Target final score (out of total_score)
             current_scores_by_item: Dict with keys like "CategoryName_0", "CategoryName_1", etc.
             config: Course configuration with category info
+            strategy: "balanced" raises every remaining item to the same lowest
+                possible fraction of its maximum, "fewest" changes as few items
+                as possible, "proportional" is the original per-category split
+        
+        Returns:
+            Dict with goal scores for each item that needs to be improved
+        """
+        schema = compile_schema(config)
+        return self.goal_scores_from_array(target_grade, schema.parse(current_scores_by_item), schema, strategy)
+    
+    def goal_scores_from_array(self, target_grade, current_scores, schema, strategy='balanced'):
+        """
+        Same as calculate_goal_scores, for scores already parsed by a CourseSchema.
+        
+        Args:
+            target_grade: Target final score (out of total_score)
+            current_scores: Flat list of current scores in schema item order
+            schema: Compiled CourseSchema of this course
+            strategy: "balanced", "fewest" or "proportional"
         
         Returns:
             Dict with goal scores for each item that needs to be improved
         """
+        needed_score = target_grade - self.total_achieved_score()
+        return solve_goal(schema.keys, current_scores, schema.item_maxima, needed_score,
+                          strategy, schema.item_categories, goal_ceilings(schema, current_scores))
+    
+    def goal_curve_from_array(self, current_scores, schema, strategy='balanced'):
+        """
+        Goal scores for every target grade at once, as a compact curve.
+        
+        Args:
+            current_scores: Flat list of current scores in schema item order
+            schema: Compiled CourseSchema of this course
+            strategy: "balanced" or "fewest"
+        
+        Returns:
+            Dict with the remaining items ("keys", "current", "maxima", "caps")
+            and the breakpoints over the reachable target range: for
+            "balanced", segments starting at "targets" where the common level
+            is levels[k] + (target - targets[k]) / widths[k] and each item's
+            goal is min(maximum * level, cap) when above its current score;
+            for "fewest", the fill "order" (positions in keys) and the target
+            reached once each item in that order is full
+        """
+        curve = goal_curve(current_scores, schema.item_maxima, strategy, goal_ceilings(schema, current_scores))
         current_total = self.total_achieved_score()
-        needed_score = target_grade - current_total
-        
-        if needed_score <= 0:
-            return {}  # Already achieved or exceeded target
-        
-        # Find remaining items and their potential contribution
-        remaining_items = []
-        
-        for cat_config in config['categories']:
-            cat_name = cat_config['name']
-            max_per_item = cat_config['max_score'] / cat_config['item_count']
-            
-            for i in range(cat_config['item_count']):
-                key = f"{cat_name}_{i}"
-                current_score = float(current_scores_by_item.get(key, 0) or 0)
-                
-                # Calculate how much more this item can contribute
-                remaining_potential = max_per_item - current_score
-                
-                if remaining_potential > 0:
-                    remaining_items.append({
-                        'key': key,
-                        'category': cat_name,
-                        'index': i,
-                        'current': current_score,
-                        'max_per_item': max_per_item,
-                        'remaining_potential': remaining_potential,
-                        'item_count': cat_config['item_count']
-                    })
-        
-        if not remaining_items:
-            return {}  # No remaining items
-        
-        # Sort by item_count (favor categories with more items for distribution)
-        # Then by remaining potential
-        remaining_items.sort(key=lambda x: (-x['item_count'], -x['remaining_potential']))
-        
-        # Distribute needed score across remaining items
-        goal_scores = {}
-        total_distributed = 0
-        
-        # Calculate proportional distribution
-        total_potential = sum(item['remaining_potential'] for item in remaining_items)
-        
-        if total_potential < needed_score:
-            # Not enough potential to reach target
-            # Distribute all available potential
-            for item in remaining_items:
-                goal_scores[item['key']] = {
-                    'current': item['current'],
-                    'goal': item['max_per_item'],
-                    'needed': item['remaining_potential']
-                }
-            return goal_scores
-        
-        # Distribute proportionally, but favor equal distribution
-        # First pass: equal distribution per category
-        category_needs = {}
-        for item in remaining_items:
-            if item['category'] not in category_needs:
-                category_needs[item['category']] = []
-            category_needs[item['category']].append(item)
-        
-        # Distribute proportionally within each category
-        for category, items in category_needs.items():
-            category_potential = sum(item['remaining_potential'] for item in items)
-            if category_potential > 0:
-                category_share = (category_potential / total_potential) * needed_score
-                
-                # Distribute within category
-                for item in items:
-                    item_share = (item['remaining_potential'] / category_potential) * category_share
-                    goal_score = min(item['current'] + item_share, item['max_per_item'])
-                    needed = max(0, goal_score - item['current'])
-                    
-                    if needed > 0.01:  # Only include if meaningful difference
-                        goal_scores[item['key']] = {
-                            'current': item['current'],
-                            'goal': goal_score,
-                            'needed': needed
-                        }
-        
-        return goal_scores
+        items = curve['items']
+        position = {i: p for p, i in enumerate(items)}
+        
+        result = {
+            "course_name": self.name,
+            "strategy": strategy,
+            "current_total": current_total,
+            "max_total": current_total + curve['total_headroom'],
+            "keys": [schema.keys[i] for i in items],
+            "current": [current_scores[i] for i in items],
+            "maxima": [schema.item_maxima[i] for i in items],
+            "caps": [schema.item_maxima[i] * curve['ceilings'][i] for i in items]
+        }
+        if strategy == 'fewest':
+            result["order"] = [position[i] for i in curve['order']]
+            result["targets"] = [current_total + filled for filled in curve['filled']]
+        else:
+            # Segments of zero length (items sharing a breakpoint) carry no information
+            segments = [k for k in range(len(curve['levels'])) if curve['ends'][k] > curve['gained'][k]]
+            result["targets"] = [current_total + curve['gained'][k] for k in segments]
+            result["levels"] = [curve['levels'][k] for k in segments]
+            result["widths"] = [curve['widths'][k] for k in segments]
+        return result
     
     def calculate_whatif(self, hypothetical_scores, current_scores_by_item, config):
         """
@@ -139,25 +150,18 @@ class Course:
         merged_scores = current_scores_by_item.copy()
         merged_scores.update(hypothetical_scores)
         
-        # Rebuild categories with merged scores
-        whatif_categories = []
-        for cat_config in config['categories']:
-            cat_name = cat_config['name']
-            scores = []
-            
-            for i in range(cat_config['item_count']):
-                key = f"{cat_name}_{i}"
-                score = merged_scores.get(key, 0)
-                try:
-                    scores.append(float(score) if score else 0)
-                except (ValueError, TypeError):
-                    scores.append(0)
-            
-            category = Category(cat_name, scores, cat_config['max_score'])
-            whatif_categories.append(category)
-        
-        # Create temporary course with what-if scores
-        whatif_course = Course(self.name, whatif_categories, self.total_score)
+        schema = compile_schema(config)
+        return self.whatif_from_array(schema.parse(merged_scores), schema)
+    
+    def whatif_from_array(self, whatif_scores, schema):
+        """
+        Same as calculate_whatif, for a flat list of scores (current scores with
+        the hypothetical ones already merged in) parsed by a CourseSchema.
+        
+        Returns:
+            Dict with what-if results
+        """
+        whatif_course = Course.from_schema(self.name, schema, whatif_scores)
         
         total_achieved = whatif_course.total_achieved_score()
         total_percentage = (total_achieved / self.total_score) * 100
@@ -176,7 +180,7 @@ class Course:
             "difference": difference
         }
         
-        for category in whatif_categories:
+        for category in whatif_course.categories:
             results["categories"].append({
                 "name": category.name,
                 "achieved": category.achieved_score(),
@@ -184,4 +188,4 @@ class Course:
                 "percentage": category.percentage()
             })
         
-        return results
\ No newline at end of file
+        return results
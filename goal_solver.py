@@ -0,0 +1,260 @@
+"""
+Goal score solvers.
+
+Every solver works on flat, parallel lists describing the remaining items of a
+course: the item keys ("CategoryName_0", ...), the current score of each item
+and the maximum score of each item. They return the dict shape used by the
+/goal route and goal_results.html: {key: {'current', 'goal', 'needed'}}.
+"""
+
+from bisect import bisect_left
+
+STRATEGIES = ('balanced', 'fewest', 'proportional')
+
+# Strategies whose goal scores can be precomputed as a curve over the needed score
+CURVE_STRATEGIES = ('balanced', 'fewest')
+
+
+def solve_goal(keys, current, maxima, needed_score, strategy='balanced', categories=None, ceilings=None):
+    """
+    Distribute needed_score over the remaining items using the given strategy.
+
+    Args:
+        keys: Item keys like "CategoryName_0"
+        current: Current score of each item
+        maxima: Maximum score of each item
+        needed_score: Points still needed to reach the target
+        strategy: "balanced", "fewest" or "proportional"
+        categories: Category name of each item (only used by "proportional")
+        ceilings: Optional highest fraction of its maximum each item may count
+            for (defaults to 1.0 for every item)
+
+    Returns:
+        Dict with goal scores for each item that needs to be improved
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown goal strategy: {strategy}")
+    if needed_score <= 0:
+        return {}  # Already achieved or exceeded target
+    if ceilings is None:
+        ceilings = [1.0] * len(keys)
+
+    # Only items with room to improve take part
+    items = [i for i in range(len(keys))
+             if maxima[i] > 0 and current[i] < maxima[i] * ceilings[i]]
+    if not items:
+        return {}  # No remaining items
+
+    headroom = [maxima[i] * ceilings[i] - current[i] for i in range(len(keys))]
+    if sum(headroom[i] for i in items) <= needed_score:
+        # Not enough potential to reach target, so every item goes to its maximum
+        return {keys[i]: _goal(current[i], maxima[i] * ceilings[i]) for i in items}
+
+    if strategy == 'balanced':
+        level = balanced_level(current, maxima, ceilings, items, needed_score)
+        goal_scores = {}
+        for i in items:
+            goal = maxima[i] * min(level, ceilings[i])
+            if goal > current[i]:
+                goal_scores[keys[i]] = _goal(current[i], goal)
+        return goal_scores
+
+    if strategy == 'fewest':
+        return _fewest_items(keys, current, headroom, items, needed_score)
+
+    return _proportional(keys, current, headroom, items, needed_score, categories)
+
+
+def balanced_level(current, maxima, ceilings, items, needed_score):
+    """
+    Find the common score level (as a fraction of each item's maximum) that
+    exactly covers needed_score.
+
+    This is water-filling: item i holds water between its current level
+    current/max and its ceiling, with width max. Sorting the 2n level
+    breakpoints and sweeping once gives the exact level in O(n log n).
+    """
+    events = []
+    for i in items:
+        events.append((current[i] / maxima[i], maxima[i]))
+        events.append((ceilings[i], -maxima[i]))
+    events.sort()
+
+    gained = 0.0
+    width = 0.0
+    level = events[0][0]
+    for breakpoint, delta in events:
+        step = width * (breakpoint - level)
+        if width > 0 and gained + step >= needed_score:
+            return level + (needed_score - gained) / width
+        gained += step
+        level = breakpoint
+        width += delta
+
+    return level
+
+
+def goal_curve(current, maxima, strategy='balanced', ceilings=None):
+    """
+    Precompute the goal scores of a strategy for every needed score at once.
+
+    Goal scores are piecewise linear in the needed score. For "balanced" the
+    curve is the list of water-filling segments: in segment k, for needed
+    scores between gained[k] and ends[k], the common level is
+    levels[k] + (needed - gained[k]) / widths[k], and every item between its
+    current level and its ceiling rises at maximum / widths[k] points per
+    point needed. For "fewest" it is the fill order and the cumulative
+    headroom after each filled item.
+
+    Args:
+        current: Current score of each item
+        maxima: Maximum score of each item
+        strategy: "balanced" or "fewest"
+        ceilings: Optional highest fraction of its maximum each item may count for
+
+    Returns:
+        Dict describing the curve; pass it to goal_from_curve
+    """
+    if strategy not in CURVE_STRATEGIES:
+        raise ValueError(f"No goal curve for strategy: {strategy}")
+    if ceilings is None:
+        ceilings = [1.0] * len(current)
+
+    items = [i for i in range(len(current))
+             if maxima[i] > 0 and current[i] < maxima[i] * ceilings[i]]
+    headroom = [maxima[i] * ceilings[i] - current[i] for i in range(len(current))]
+    curve = {
+        'strategy': strategy,
+        'items': items,
+        'ceilings': ceilings,
+        'total_headroom': sum(headroom[i] for i in items)
+    }
+
+    if strategy == 'fewest':
+        order = sorted(items, key=lambda i: -headroom[i])
+        filled = []
+        total = 0.0
+        for i in order:
+            total += headroom[i]
+            filled.append(total)
+        curve.update(order=order, headroom=headroom, filled=filled)
+        return curve
+
+    # Same sweep as balanced_level, recording every segment instead of stopping
+    events = []
+    for i in items:
+        events.append((current[i] / maxima[i], maxima[i]))
+        events.append((ceilings[i], -maxima[i]))
+    events.sort()
+
+    levels, gained_at, widths, ends = [], [], [], []
+    gained = 0.0
+    width = 0.0
+    level = events[0][0] if events else 0.0
+    for breakpoint, delta in events:
+        step = width * (breakpoint - level)
+        if width > 0:
+            levels.append(level)
+            gained_at.append(gained)
+            widths.append(width)
+            ends.append(gained + step)
+        gained += step
+        level = breakpoint
+        width += delta
+    curve.update(levels=levels, gained=gained_at, widths=widths, ends=ends, final_level=level)
+    return curve
+
+
+def goal_from_curve(keys, current, maxima, curve, needed_score):
+    """
+    Evaluate a goal curve at one needed score.
+
+    Returns exactly what solve_goal returns for the same strategy and scores.
+    For "balanced" the segment is found by binary search; "fewest" walks its
+    fill order only as far as the items that change.
+    """
+    if needed_score <= 0:
+        return {}
+    items = curve['items']
+    if not items:
+        return {}
+    ceilings = curve['ceilings']
+
+    if curve['total_headroom'] <= needed_score:
+        return {keys[i]: _goal(current[i], maxima[i] * ceilings[i]) for i in items}
+
+    if curve['strategy'] == 'fewest':
+        # Fill in the precomputed order; this stops at the last item that changes
+        headroom = curve['headroom']
+        goal_scores = {}
+        remaining = needed_score
+        for i in curve['order']:
+            share = min(headroom[i], remaining)
+            goal_scores[keys[i]] = _goal(current[i], current[i] + share)
+            remaining -= share
+            if remaining <= 0:
+                break
+        return {keys[i]: goal_scores[keys[i]] for i in items if keys[i] in goal_scores}
+
+    k = bisect_left(curve['ends'], needed_score)
+    if k < len(curve['ends']):
+        level = curve['levels'][k] + (needed_score - curve['gained'][k]) / curve['widths'][k]
+    else:
+        level = curve['final_level']
+    goal_scores = {}
+    for i in items:
+        goal = maxima[i] * min(level, ceilings[i])
+        if goal > current[i]:
+            goal_scores[keys[i]] = _goal(current[i], goal)
+    return goal_scores
+
+
+def _fewest_items(keys, current, headroom, items, needed_score):
+    """Fill the items with the most headroom first so the fewest items change"""
+    goal_scores = {}
+    remaining = needed_score
+    for i in sorted(items, key=lambda i: -headroom[i]):
+        share = min(headroom[i], remaining)
+        goal_scores[keys[i]] = _goal(current[i], current[i] + share)
+        remaining -= share
+        if remaining <= 0:
+            break
+
+    # Report in course order rather than fill order
+    return {keys[i]: goal_scores[keys[i]] for i in items if keys[i] in goal_scores}
+
+
+def _proportional(keys, current, headroom, items, needed_score, categories):
+    """
+    Original heuristic: split the needed score across categories in proportion
+    to their headroom, then across items within each category.
+    """
+    if categories is None:
+        categories = [None] * len(keys)
+    total_potential = sum(headroom[i] for i in items)
+
+    # Favor categories with more items, then items with more headroom
+    item_counts = {}
+    for category in categories:
+        item_counts[category] = item_counts.get(category, 0) + 1
+    ordered = sorted(items, key=lambda i: (-item_counts[categories[i]], -headroom[i]))
+
+    category_items = {}
+    for i in ordered:
+        category_items.setdefault(categories[i], []).append(i)
+
+    goal_scores = {}
+    for members in category_items.values():
+        category_potential = sum(headroom[i] for i in members)
+        category_share = (category_potential / total_potential) * needed_score
+        for i in members:
+            item_share = (headroom[i] / category_potential) * category_share
+            goal = min(current[i] + item_share, current[i] + headroom[i])
+            if goal - current[i] > 0.01:  # Only include if meaningful difference
+                goal_scores[keys[i]] = _goal(current[i], goal)
+
+    return goal_scores
+
+
+def _goal(current, goal):
+    return {'current': current, 'goal': goal, 'needed': goal - current}
@@ -0,0 +1,310 @@
+"""
+Streaming gradebook import and export.
+
+Reads a CSV or JSON-lines gradebook one row at a time, maps its columns onto
+a course's "CategoryName_i" item keys, grades it chunk by chunk with the
+vectorized batch engine and writes graded rows back out as they are produced.
+Memory use depends on the chunk size, not on the size of the file.
+
+Command line usage:
+    python gradebook.py --config course.json roster.csv > graded.csv
+    python gradebook.py --course "Analysis" roster.jsonl --output-format jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import re
+import sys
+
+import numpy as np
+
+from batch import grade_matrix
+from schema import compile_schema, parse_score
+
+CHUNK_SIZE = 1000
+ID_COLUMNS = ('student_id', 'id', 'student', 'email', 'name')
+FORMATS = ('csv', 'jsonl')
+
+
+def read_rows(stream, fmt='csv'):
+    """
+    Yield one dict per student from a text stream.
+
+    Args:
+        stream: Text file-like object
+        fmt: "csv" (first row is the header) or "jsonl" (one JSON object per line)
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unknown gradebook format: {fmt}")
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    """Group an iterable into lists of at most size items"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_columns(schema, columns, mapping=None):
+    """
+    Work out which gradebook column feeds which course item.
+
+    Columns match an item when they are the item key itself ("Homework_0"),
+    the category name followed by a 1-based number ("Homework 1",
+    "Homework #1"), or just the category name for single-item categories
+    ("Final"), ignoring case. An explicit mapping of column -> item key
+    takes precedence.
+
+    Returns:
+        List of (column, item index) pairs
+    """
+    mapping = mapping or {}
+    lookup = {key.lower(): index for key, index in schema.key_index.items()}
+
+    # A category with a single item can be named on its own ("Final" -> "final_0")
+    single_items = {}
+    for c, name in enumerate(schema.category_names):
+        if schema.offsets[c + 1] - schema.offsets[c] == 1:
+            single_items[name.lower()] = schema.keys[schema.offsets[c]].lower()
+
+    pairs = []
+    for column in columns:
+        if column in mapping:
+            if mapping[column] not in schema.key_index:
+                raise ValueError(f"Unknown item key in mapping: {mapping[column]}")
+            pairs.append((column, schema.key_index[mapping[column]]))
+            continue
+
+        key = column.strip().lower()
+        if key in single_items:
+            key = single_items[key]
+        if key not in lookup:
+            # "Homework 3" / "Homework #3" -> "homework_2"
+            match = re.match(r'^(.*?)\s*#?\s*(\d+)$', key)
+            if match and int(match.group(2)) >= 1:
+                key = f"{match.group(1)}_{int(match.group(2)) - 1}"
+        if key in lookup:
+            pairs.append((column, lookup[key]))
+    return pairs
+
+
+def find_id_column(columns):
+    """Returns the column that identifies students, or None"""
+    lowered = {column.strip().lower().replace(' ', '_'): column for column in columns}
+    for candidate in ID_COLUMNS:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+def grade_rows(config, rows, mapping=None, id_column=None, chunk_size=CHUNK_SIZE, cohort=None):
+    """
+    Grade a stream of gradebook rows.
+
+    Args:
+        config: Course configuration with category info
+        rows: Iterable of dicts, e.g. from read_rows
+        mapping: Optional dict of column -> item key overriding the automatic matching
+        id_column: Column identifying the student (detected when omitted)
+        chunk_size: Number of rows graded per vectorized pass
+        cohort: Optional cohort.CohortStats that every graded chunk is added to
+
+    Yields:
+        One flat dict per student: the ID, each category's achieved score and
+        percentage, and the course total and percentage
+    """
+    schema = compile_schema(config)
+    mapper = RowMapper(schema, mapping, id_column)
+
+    for chunk in chunked(rows, chunk_size):
+        matrix, student_ids = mapper.parse(chunk)
+        graded = grade_matrix(schema, matrix)
+        if cohort is not None:
+            cohort.add_graded(graded)
+        yield from graded_records(schema, graded, student_ids)
+
+
+class RowMapper:
+    """
+    Parses gradebook rows into score matrices.
+
+    CSV rows all carry the header's columns, but JSON-lines rows are objects
+    that often leave out blank scores, so their keys differ from row to row.
+    Every distinct set of keys is therefore mapped with map_columns on its
+    own and cached; a CSV gradebook is mapped once.
+
+    Whether records get a student ID is decided by the first row (or an
+    explicit id_column), so every output record has the same fields.
+    """
+
+    # Distinct key sets kept before the cache starts over
+    MAX_LAYOUTS = 4096
+
+    def __init__(self, schema, mapping=None, id_column=None):
+        self.schema = schema
+        self.mapping = mapping
+        self.id_column = id_column
+        self.with_ids = None if id_column is None else True
+        self._layouts = {}
+
+    def layout(self, row):
+        """Returns the (column, item index) pairs and the ID column for a row's keys"""
+        columns = tuple(row.keys())
+        layout = self._layouts.get(columns)
+        if layout is None:
+            if len(self._layouts) >= self.MAX_LAYOUTS:
+                self._layouts.clear()
+            # csv.DictReader files the extra fields of an over-long row under None
+            named = [column for column in columns if isinstance(column, str)]
+            id_column = self.id_column if self.id_column is not None else find_id_column(named)
+            layout = self._layouts[columns] = (map_columns(self.schema, named, self.mapping), id_column)
+        return layout
+
+    def parse(self, rows):
+        """
+        Returns a (rows x items) matrix in schema item order, with column-major
+        storage for batch.grade_matrix, and the student IDs (None when the
+        gradebook has no ID column)
+        """
+        matrix = np.zeros((len(rows), len(self.schema)), order='F')
+        student_ids = []
+        for row, scores in enumerate(rows):
+            pairs, id_column = self.layout(scores)
+            if self.with_ids is None:
+                self.with_ids = id_column is not None
+            for column, index in pairs:
+                matrix[row, index] = parse_score(scores.get(column))
+            student_ids.append(scores.get(id_column) if id_column is not None else None)
+        return matrix, student_ids if self.with_ids else None
+
+    def parse_row(self, row):
+        """
+        Returns one row's scores as a list in schema item order, and its
+        student ID (None when the gradebook has no ID column)
+        """
+        pairs, id_column = self.layout(row)
+        if self.with_ids is None:
+            self.with_ids = id_column is not None
+        scores = [0] * len(self.schema)
+        for column, index in pairs:
+            scores[index] = parse_score(row.get(column))
+        return scores, row.get(id_column) if self.with_ids and id_column is not None else None
+
+
+def graded_records(schema, graded, student_ids=None):
+    """Yield the flat output record of every student in a grade_matrix result"""
+    for row in range(len(graded["total_achieved"])):
+        record = {}
+        if student_ids is not None:
+            record['student_id'] = student_ids[row]
+        for c, name in enumerate(schema.category_names):
+            record[f"{name} achieved"] = float(graded["achieved"][row, c])
+            record[f"{name} percentage"] = float(graded["percentage"][row, c])
+        record['total_achieved'] = float(graded["total_achieved"][row])
+        record['total_percentage'] = float(graded["total_percentage"][row])
+        yield record
+
+
+def to_csv(records):
+    """Yield CSV text for graded records: a header line, then one line per record"""
+    buffer = io.StringIO()
+    writer = None
+    for record in records:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(record.keys()))
+            writer.writeheader()
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def to_jsonl(records):
+    """Yield one JSON line per graded record"""
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+def export(records, fmt='csv'):
+    """Serialize graded records in the given format, one chunk of text at a time"""
+    if fmt == 'csv':
+        return to_csv(records)
+    if fmt == 'jsonl':
+        return to_jsonl(records)
+    raise ValueError(f"Unknown gradebook format: {fmt}")
+
+
+def guess_format(filename, default='csv'):
+    """Picks the gradebook format from a file name"""
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def load_config(config_path=None, course_name=None):
+    """
+    Load a course config for the command line.
+
+    The config file holds either a single course config or a dict of course
+    name -> config; without a file, predefined_courses.py is used.
+    """
+    if config_path:
+        with open(config_path) as f:
+            configs = json.load(f)
+        if 'categories' in configs:
+            return configs
+    else:
+        from predefined_courses import COURSE_CONFIGS as configs
+
+    if course_name not in configs:
+        raise SystemExit(f"Course not found: {course_name}")
+    return configs[course_name]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a CSV or JSON-lines gradebook")
+    parser.add_argument('input', help="Gradebook file, or - for stdin")
+    parser.add_argument('--config', help="JSON file with a course config (or a dict of them)")
+    parser.add_argument('--course', help="Course name in the config file or predefined courses")
+    parser.add_argument('--format', choices=FORMATS, help="Input format (default: from the file name)")
+    parser.add_argument('--output-format', choices=FORMATS, default='csv')
+    parser.add_argument('--output', '-o', help="Output file (default: stdout)")
+    parser.add_argument('--map', action='append', default=[], metavar='COLUMN=ITEM_KEY',
+                        help="Map a gradebook column onto an item key, e.g. 'HW1 Score=Homework_0'")
+    parser.add_argument('--id-column', help="Column identifying students")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, args.course)
+    mapping = dict(item.rsplit('=', 1) for item in args.map)
+    fmt = args.format or guess_format(args.input)
+
+    source = sys.stdin if args.input == '-' else open(args.input, newline='')
+    target = sys.stdout if not args.output else open(args.output, 'w', newline='')
+    try:
+        records = grade_rows(config, read_rows(source, fmt), mapping, args.id_column, args.chunk_size)
+        for text in export(records, args.output_format):
+            target.write(text)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Server-held grading sessions for incremental recalculation.
+
+A client opens a session for a course with its current scores, then sends
+only the items that changed. The session keeps a Course built from the
+compiled schema and updates the affected category, the course total and the
+open what-if view by the difference of each changed item, so the work and
+the response size per update depend on the number of changed items, not on
+the size of the course. Capped categories apply the cap to their running
+total; only categories with a drop-lowest policy are recomputed as a whole
+when one of their items changes.
+
+Running totals may differ from a fresh sum in the last bits, so the numbers
+equal those of /calculate, /whatif and /goal up to floating-point rounding.
+"""
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from collections import OrderedDict
+
+from course import Course
+from goal_solver import STRATEGIES, solve_goal
+from policies import goal_ceilings, policy_total
+from schema import parse_score
+
+
+class GradingSession:
+    """Live state of one student's course: current scores plus optional goal and what-if views"""
+
+    def __init__(self, course_name, schema, scores, owner=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.course_name = course_name
+        self.schema = schema
+        self.scores = list(scores)
+        self.course = Course.from_schema(course_name, schema, self.scores)
+        self.total = self.course.total_achieved_score()
+        self.version = 0
+        self.touched = time.monotonic()
+        self.lock = threading.Lock()
+
+        # What-if view: item index -> hypothetical score, each category's uncapped sum
+        # with the hypothetical scores overlaid, and the points that gives
+        self.hypothetical = {}
+        self.whatif_sums = [sum(self.scores[schema.offsets[c]:schema.offsets[c + 1]])
+                            for c in range(len(schema.category_names))]
+        self.whatif_totals = [category.achieved_score() for category in self.course.categories]
+        self.whatif_total = self.total
+
+        # Goal view, solved again whenever the total moves
+        self.target_grade = None
+        self.strategy = 'balanced'
+        self.goal_scores = {}
+
+    def _locate(self, key):
+        """Returns (category index, index within the category) of an item key"""
+        index = self.schema.key_index.get(key)
+        if index is None:
+            raise KeyError(key)
+        c = bisect_right(self.schema.offsets, index) - 1
+        return index, c, index - self.schema.offsets[c]
+
+    def _parse_changes(self, changes):
+        """Validates item keys up front so a bad update changes nothing"""
+        if not isinstance(changes, dict):
+            raise TypeError("Send an object of item key -> score")
+        unknown = [key for key in changes if key not in self.schema.key_index]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+        return [(key, self._locate(key)) for key in changes]
+
+    def _refresh_whatif(self, c):
+        """
+        Update a category's what-if points after its what-if sum or scores
+        changed; returns True if the points changed. Only a drop-lowest
+        category is evaluated again from all of its scores.
+        """
+        keep, cap = self.schema.category_keeps[c], self.schema.category_caps[c]
+        if keep is None:
+            total = self.whatif_sums[c] if cap is None else min(self.whatif_sums[c], cap)
+        else:
+            start, stop = self.schema.offsets[c], self.schema.offsets[c + 1]
+            values = [self.hypothetical.get(i, self.scores[i]) for i in range(start, stop)]
+            total = policy_total(values, keep, cap)
+        if total == self.whatif_totals[c]:
+            return False
+        self.whatif_total += total - self.whatif_totals[c]
+        self.whatif_totals[c] = total
+        return True
+
+    def _category_fields(self, c, achieved):
+        max_score = self.schema.category_max_scores[c]
+        return {
+            "achieved": achieved,
+            "percentage": (achieved / max_score) * 100 if max_score != 0 else 0
+        }
+
+    def _whatif_fields(self, categories):
+        return {
+            "categories": {
+                self.schema.category_names[c]: self._category_fields(c, self.whatif_totals[c])
+                for c in sorted(categories)
+            },
+            "total_achieved": self.whatif_total,
+            "total_percentage": (self.whatif_total / self.schema.total_score) * 100,
+            "current_total": self.total,
+            "difference": self.whatif_total - self.total
+        }
+
+    def _solve_goal(self):
+        """Re-solve the goal view and return only the entries that changed"""
+        if self.target_grade is None:
+            return None
+        goal_scores = solve_goal(self.schema.keys, self.scores, self.schema.item_maxima,
+                                 self.target_grade - self.total, self.strategy, self.schema.item_categories,
+                                 goal_ceilings(self.schema, self.scores))
+        changed = {key: goal for key, goal in goal_scores.items() if self.goal_scores.get(key) != goal}
+        removed = [key for key in self.goal_scores if key not in goal_scores]
+        self.goal_scores = goal_scores
+        return {"goal_scores": changed, "removed": removed}
+
+    def snapshot(self):
+        """Full state: the numbers /calculate, /goal and /whatif would return, up to rounding"""
+        state = {
+            "session_id": self.id,
+            "version": self.version,
+            "course_name": self.course_name,
+            "categories": [
+                dict(name=category.name, max_score=category.max_score,
+                     **self._category_fields(c, category.achieved_score()))
+                for c, category in enumerate(self.course.categories)
+            ],
+            "total_achieved": self.total,
+            "total_max": self.schema.total_score,
+            "total_percentage": (self.total / self.schema.total_score) * 100
+        }
+        if self.hypothetical:
+            state["whatif"] = self._whatif_fields(range(len(self.schema.category_names)))
+            state["whatif"]["hypothetical_scores"] = {
+                self.schema.keys[i]: score for i, score in sorted(self.hypothetical.items())
+            }
+        if self.target_grade is not None:
+            state["goal"] = {"target_grade": self.target_grade, "strategy": self.strategy,
+                             "goal_scores": self.goal_scores}
+        return state
+
+    def update_scores(self, changes):
+        """
+        Apply changed item scores.
+
+        Args:
+            changes: Dict of item key -> new score (blank counts as 0)
+
+        Returns:
+            Dict with only the fields that changed: the affected categories,
+            the course total, and the open what-if and goal views
+        """
+        located = self._parse_changes(changes)
+        previous_points = {}  # changed category -> its points before this update
+        for key, (index, c, j) in located:
+            score = parse_score(changes[key])
+            delta = score - self.scores[index]
+            if delta == 0:
+                continue
+            self.scores[index] = score
+            category = self.course.categories[c]
+            previous_points.setdefault(c, category.achieved_score())
+            category.set_item(j, score)
+            if index not in self.hypothetical:
+                # A hypothetical score hides the real one in the what-if view
+                self.whatif_sums[c] += delta
+        categories = set(previous_points)
+
+        # Caps and drop-lowest policies are applied once per category, however many of its items changed
+        for c, previous in previous_points.items():
+            self.total += self.course.categories[c].achieved_score() - previous
+        whatif_categories = {c for c in categories if self._refresh_whatif(c)}
+
+        self.version += 1
+        result = {"version": self.version}
+        if not categories:
+            return result
+
+        result["categories"] = {
+            self.schema.category_names[c]: self._category_fields(c, self.course.categories[c].achieved_score())
+            for c in sorted(categories)
+        }
+        result["total_achieved"] = self.total
+        result["total_percentage"] = (self.total / self.schema.total_score) * 100
+        if self.hypothetical:
+            result["whatif"] = self._whatif_fields(whatif_categories)
+        goal = self._solve_goal()
+        if goal is not None:
+            result["goal"] = goal
+        return result
+
+    def update_whatif(self, changes):
+        """
+        Set or clear hypothetical scores.
+
+        Args:
+            changes: Dict of item key -> hypothetical score; a blank or null
+                value removes the item's hypothetical score
+
+        Returns:
+            Dict with the changed what-if categories and totals
+        """
+        located = self._parse_changes(changes)
+        categories = set()
+        for key, (index, c, j) in located:
+            value = changes[key]
+            previous = self.hypothetical.get(index, self.scores[index])
+            if value is None or value == '':
+                self.hypothetical.pop(index, None)
+                score = self.scores[index]
+            else:
+                score = parse_score(value)
+                self.hypothetical[index] = score
+            if score != previous:
+                self.whatif_sums[c] += score - previous
+                categories.add(c)
+        for c in categories:
+            self._refresh_whatif(c)
+
+        self.version += 1
+        return {"version": self.version, "whatif": self._whatif_fields(categories)}
+
+    def set_goal(self, target_grade, strategy='balanced'):
+        """Open or change the goal view; returns the full goal scores"""
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown goal strategy: {strategy}")
+        self.target_grade = target_grade
+        self.strategy = strategy
+        self.goal_scores = {}
+        self._solve_goal()
+        self.version += 1
+        return {"version": self.version, "target_grade": target_grade, "strategy": strategy,
+                "current_total": self.total, "goal_scores": self.goal_scores}
+
+
+class SessionStore:
+    """In-memory store of grading sessions with LRU eviction and an idle timeout"""
+
+    def __init__(self, max_sessions=10000, ttl=3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session):
+        with self._lock:
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id, owner=None):
+        """Returns the session if it exists, belongs to owner and has not expired, else None"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return None
+            if now - session.touched > self.ttl:
+                del self._sessions[session_id]
+                return None
+            session.touched = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id, owner=None):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return False
+            del self._sessions[session_id]
+            return True
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,226 @@
+"""
+Request instrumentation and a Prometheus-text /metrics endpoint.
+
+Every request is counted and timed per route. Inside a view, wrap the steps
+of the work in phase() to get a per-phase breakdown:
+
+    with phase('parse'):
+        scores = schema.parse(data)
+
+Cache hit/miss counts are collected from callbacks registered with
+Registry.counter_callback. Set GRADE_CALCULATOR_PROFILE to a file path to
+enable the sampling profiler, which writes the stacks of the slowest requests
+to that file.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=None):
+    """Formats (name, value) label pairs as {name="value",...}"""
+    items = list(labels)
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+class Registry:
+    """Thread-safe store of counters and histograms, rendered as Prometheus text"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}  # name -> {labels tuple: value}
+        self._histograms = {}  # name -> {labels tuple: [bucket counts..., sum, count]}
+        self._callbacks = []  # (name, labels, function) read at scrape time
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), amount=1):
+        """Increments a counter; labels is a tuple of (name, value) pairs"""
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        """Records one observation in a histogram"""
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            buckets = series.get(labels)
+            if buckets is None:
+                buckets = series[labels] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            buckets[-2] += value
+            buckets[-1] += 1
+
+    def counter_callback(self, name, help_text, function, labels=()):
+        """Exposes a counter whose value is read from function() at scrape time"""
+        self.describe(name, 'counter', help_text)
+        self._callbacks.append((name, labels, function))
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {labels: list(b) for labels, b in series.items()}
+                          for name, series in self._histograms.items()}
+        for name, labels, function in self._callbacks:
+            counters.setdefault(name, {})[labels] = function()
+
+        lines = []
+        for name, series in counters.items():
+            kind, help_text = self._help.get(name, ('counter', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series.items():
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        for name, series in histograms.items():
+            kind, help_text = self._help.get(name, ('histogram', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, buckets in series.items():
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    lines.append(f"{name}_bucket{_labels(labels, ('le', bound))} {buckets[i]}")
+                lines.append(f"{name}_bucket{_labels(labels, ('le', '+Inf'))} {buckets[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {buckets[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {buckets[-1]}")
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+registry.describe('grade_calculator_requests_total', 'counter', "Requests handled, by route, method and status")
+registry.describe('grade_calculator_request_seconds', 'histogram', "Request latency in seconds, by route")
+registry.describe('grade_calculator_phase_seconds', 'histogram', "Time spent in each phase of a request, by route")
+
+
+@contextmanager
+def phase(name):
+    """Times a phase of the current request; does nothing outside a request"""
+    if not has_request_context():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = g.setdefault('metric_phases', {})
+        phases[name] = phases.get(name, 0) + time.perf_counter() - start
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler for the slowest requests.
+
+    A background thread samples the stack of every thread that is serving a
+    request. When a request finishes among the `keep` slowest seen so far, its
+    samples are kept and all kept requests are written to `path` as folded
+    stacks ("frame;frame;frame count"), ready for flamegraph tools.
+    """
+
+    def __init__(self, path, interval=0.005, keep=10):
+        self.path = path
+        self.interval = interval
+        self.keep = keep
+        self._active = {}  # thread id -> {stack: count}
+        self._slowest = []  # (duration, description, samples)
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name='slow-request-profiler', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = self._fold(frame)
+                        samples[stack] = samples.get(stack, 0) + 1
+
+    @staticmethod
+    def _fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def start(self):
+        with self._lock:
+            self._active[threading.get_ident()] = {}
+
+    def stop(self, duration, description):
+        """Ends sampling for the current thread's request and keeps it if it is among the slowest"""
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+            if samples is None:
+                return
+            if len(self._slowest) >= self.keep and duration <= self._slowest[-1][0]:
+                return
+            self._slowest.append((duration, description, samples))
+            self._slowest.sort(key=lambda entry: -entry[0])
+            del self._slowest[self.keep:]
+
+            with open(self.path, 'w') as f:
+                for duration, description, samples in self._slowest:
+                    f.write(f"# {description} {duration * 1000:.2f} ms\n")
+                    for stack, count in sorted(samples.items(), key=lambda item: -item[1]):
+                        f.write(f"{stack} {count}\n")
+                    f.write("\n")
+
+
+def init_app(app, registry=registry):
+    """Install the request hooks and the /metrics endpoint on a Flask app"""
+    profile_path = app.config.get('PROFILE_PATH', os.environ.get('GRADE_CALCULATOR_PROFILE'))
+    profiler = SlowRequestProfiler(profile_path) if profile_path else None
+
+    @app.before_request
+    def start_timer():
+        g.metric_start = time.perf_counter()
+        if profiler is not None:
+            profiler.start()
+
+    @app.after_request
+    def record_request(response):
+        if 'metric_start' not in g:
+            return response
+        duration = time.perf_counter() - g.metric_start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        registry.inc('grade_calculator_requests_total',
+                     (('route', route), ('method', request.method), ('status', response.status_code)))
+        registry.observe('grade_calculator_request_seconds', duration, (('route', route),))
+        for name, seconds in g.get('metric_phases', {}).items():
+            registry.observe('grade_calculator_phase_seconds', seconds, (('route', route), ('phase', name)))
+
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # Runs even when the view raised, so no sampled thread is left behind
+        if profiler is not None and 'metric_start' in g:
+            profiler.stop(time.perf_counter() - g.metric_start, f"{request.method} {request.path}")
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint"""
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
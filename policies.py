@@ -0,0 +1,126 @@
+"""
+Category grading policies.
+
+A category config may declare which of its items count and how much the
+category can contribute:
+
+    {"name": "Quizzes", "item_count": 10, "max_score": 20, "drop_lowest": 2}
+    {"name": "Labs", "item_count": 10, "max_score": 40, "keep_best": 8}
+    {"name": "Bonus", "item_count": 5, "max_score": 10, "cap": 5}
+
+"drop_lowest" and "keep_best" are two ways of saying how many items count;
+max_score is what the counted items are worth together, so each item is
+worth max_score / counted items. "cap" limits the points the category adds
+to the course total.
+
+Among equal scores, earlier items are dropped first, so every code path
+(single student, batch, simulation) counts the same items.
+"""
+import heapq
+
+from goal_solver import balanced_level
+
+
+def parse_policy(cat_config):
+    """
+    Validate a category's policy.
+
+    Returns:
+        Tuple (keep, cap): the number of items that count, or None when all
+        do, and the cap on the category's points, or None
+
+    Raises:
+        ValueError: If the policy is inconsistent with the category
+    """
+    item_count = cat_config['item_count']
+    keep = None
+    if cat_config.get('drop_lowest') is not None and cat_config.get('keep_best') is not None:
+        raise ValueError(f"{cat_config['name']}: use either drop_lowest or keep_best, not both")
+    if cat_config.get('drop_lowest') is not None:
+        drop = int(cat_config['drop_lowest'])
+        if not 0 <= drop < item_count:
+            raise ValueError(f"{cat_config['name']}: drop_lowest must be between 0 and {item_count - 1}")
+        keep = item_count - drop
+    elif cat_config.get('keep_best') is not None:
+        keep = int(cat_config['keep_best'])
+        if not 1 <= keep <= item_count:
+            raise ValueError(f"{cat_config['name']}: keep_best must be between 1 and {item_count}")
+    if keep == item_count:
+        keep = None
+
+    cap = cat_config.get('cap')
+    if cap is not None:
+        cap = float(cap)
+        if cap < 0:
+            raise ValueError(f"{cat_config['name']}: cap must not be negative")
+    return keep, cap
+
+
+def dropped_items(values, keep):
+    """
+    Returns the set of indices that do not count when only the `keep` best of
+    values count. Uses a heap of size min(keep, dropped), not a full sort.
+    """
+    n = len(values)
+    if keep is None or keep >= n:
+        return set()
+    drop = n - keep
+    # Rank by (score, index): the lowest scores go first, earlier items first among equals
+    if drop <= keep:
+        return set(heapq.nsmallest(drop, range(n), key=lambda j: (values[j], j)))
+    kept = heapq.nlargest(keep, range(n), key=lambda j: (values[j], j))
+    return set(range(n)).difference(kept)
+
+
+def policy_total(values, keep=None, cap=None):
+    """The points a category adds: its counted scores summed in item order, capped"""
+    if keep is None:
+        total = sum(values)
+    else:
+        dropped = dropped_items(values, keep)
+        total = sum(value for j, value in enumerate(values) if j not in dropped)
+    if cap is not None and total > cap:
+        total = cap
+    return total
+
+
+def goal_ceilings(schema, scores):
+    """
+    Per-item ceilings (fractions of each item's maximum) for the goal solver,
+    so it only asks for points that will count.
+
+    Items that are dropped at the current scores get no room: raising the
+    counted items keeps them ahead of the dropped ones, so the effort always
+    goes to items that count. In a capped category, the room of the counted
+    items is lowered evenly until it adds up to what is left under the cap.
+
+    Returns:
+        List of fractions, or None when the course has no policies
+    """
+    if not schema.has_policies:
+        return None
+    ceilings = [1.0] * len(schema)
+    maxima = schema.item_maxima
+
+    for c in range(len(schema.category_names)):
+        keep, cap = schema.category_keeps[c], schema.category_caps[c]
+        if keep is None and cap is None:
+            continue
+        start, stop = schema.offsets[c], schema.offsets[c + 1]
+        values = scores[start:stop]
+        for j in dropped_items(values, keep):
+            ceilings[start + j] = 0.0
+        if cap is None:
+            continue
+
+        room = cap - policy_total(values, keep)
+        counted = [i for i in range(start, stop)
+                   if ceilings[i] > 0 and maxima[i] > 0 and scores[i] < maxima[i]]
+        if room <= 0:
+            for i in range(start, stop):
+                ceilings[i] = 0.0
+        elif sum(maxima[i] - scores[i] for i in counted) > room:
+            level = balanced_level(scores, maxima, ceilings, counted, room)
+            for i in counted:
+                ceilings[i] = level if level * maxima[i] > scores[i] else 0.0
+    return ceilings
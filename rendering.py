@@ -0,0 +1,162 @@
+"""
+Precompiled templates and cached page fragments.
+
+The results pages contain large parts that only depend on the course config:
+the category rows of the results table (apart from the scores in them), the
+what-if form fields and the page scripts. With fragment caching enabled those
+parts are rendered once per course schema, with placeholders where the scores
+go, and split into static text and slots. Each request then only joins the
+static text with its formatted, escaped scores.
+
+The partial templates in templates/fragments/ are used both ways: included
+directly when fragment caching is off, and rendered with Slot placeholders
+to build the cached fragments when it is on. The output is identical.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup, escape
+
+_SLOT = re.compile('\x00(score|text):([^\x00]*)\x00')
+
+
+class Slot:
+    """Placeholder for a per-request value while a fragment is being compiled"""
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+
+    def __html__(self):
+        return f"\x00{self.kind}:{self.name}\x00"
+
+    __str__ = __html__
+
+
+class SlotDict(dict):
+    """Stands in for a dict of scores: every lookup returns a text slot"""
+
+    def get(self, key, default=None):
+        return Slot('text', key)
+
+    def __bool__(self):
+        return True
+
+
+def score_filter(value):
+    """Formats a score with two decimals, the way the results pages show them"""
+    if isinstance(value, Slot):
+        return Markup(value.__html__())
+    return "%.2f" % value
+
+
+class CompiledFragment:
+    """Static text interleaved with named slots"""
+
+    def __init__(self, rendered):
+        pieces = _SLOT.split(str(rendered))
+        self.parts = pieces[0::3]
+        self.slots = list(zip(pieces[1::3], pieces[2::3]))
+
+    def fill(self, values=None):
+        """Returns the fragment with every slot replaced by its value from values"""
+        if not self.slots:
+            return Markup(self.parts[0])
+        out = [self.parts[0]]
+        for (kind, name), part in zip(self.slots, self.parts[1:]):
+            value = values[name]
+            out.append("%.2f" % value if kind == 'score' else str(escape(value)))
+            out.append(part)
+        return Markup(''.join(out))
+
+
+class FragmentRenderer:
+    """Compiles and caches the config-dependent fragments of the results pages"""
+
+    def __init__(self, app, max_entries=256):
+        self.app = app
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fragment(self, key, build):
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+
+        fragment = CompiledFragment(build())
+        with self._lock:
+            self._fragments[key] = fragment
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def _render(self, template_name, **context):
+        template = self.app.jinja_env.get_template(template_name)
+        return template.render(**context)
+
+    def category_rows(self, schema, categories):
+        """The rows of a results table, filled with the given categories' scores"""
+        def build():
+            placeholders = [
+                {'name': name, 'max_score': schema.category_max_scores[c],
+                 'achieved': Slot('score', f"achieved:{c}"), 'percentage': Slot('score', f"percentage:{c}")}
+                for c, name in enumerate(schema.category_names)
+            ]
+            return self._render('fragments/category_rows.html', results={'categories': placeholders})
+
+        values = {}
+        for c, category in enumerate(categories):
+            values[f"achieved:{c}"] = category['achieved']
+            values[f"percentage:{c}"] = category['percentage']
+        return self._fragment((schema.hash, 'category_rows'), build).fill(values)
+
+    def whatif_fields(self, schema, current_scores):
+        """The what-if form inputs, with the current scores as placeholders"""
+        def build():
+            return self._render('fragments/whatif_fields.html', config=schema.config, current_scores=SlotDict())
+
+        values = {key: current_scores.get(key, 0) for key in schema.keys}
+        return self._fragment((schema.hash, 'whatif_fields'), build).fill(values)
+
+    def static(self, template_name):
+        """A fragment that does not depend on the course at all"""
+        return self._fragment((None, template_name), lambda: self._render(template_name)).fill()
+
+    def results_page(self, schema, results, current_scores):
+        """Fragments for results.html"""
+        return {
+            'category_rows': self.category_rows(schema, results['categories']),
+            'whatif_fields': self.whatif_fields(schema, current_scores),
+            'results_scripts': self.static('fragments/results_scripts.html'),
+        }
+
+    def whatif_page(self, schema, results):
+        """Fragments for whatif_results.html"""
+        return {'category_rows': self.category_rows(schema, results['categories'])}
+
+
+def preload_templates(app):
+    """Compile every template up front so no request pays for parsing one"""
+    for name in app.jinja_env.list_templates():
+        if name.endswith('.html'):
+            app.jinja_env.get_template(name)
+
+
+def init_app(app):
+    """
+    Register the score filter and, when FRAGMENT_CACHE is enabled, preload the
+    templates and return a FragmentRenderer (otherwise None).
+    """
+    app.jinja_env.filters['score'] = score_filter
+    if not app.config.get('FRAGMENT_CACHE'):
+        return None
+    preload_templates(app)
+    return FragmentRenderer(app)
@@ -0,0 +1,211 @@
+"""
+Cache of rendered calculation results.
+
+Entries are keyed on a deterministic hash of everything a response depends on
+(route, course config hash, parsed scores and parameters). The same hash is
+sent to clients as the ETag, so conditional requests can be answered without
+computing or rendering anything.
+
+Each entry also records the config hash of its course, so editing or
+deleting a course can drop its entries. SharedResultCache keeps the entries
+in an SQLite file that every worker process of a deployment opens, so a
+result computed by one worker is served by all of them.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def result_key(*parts):
+    """Returns a stable hash of the given JSON-serializable parts"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe in-memory LRU cache of response bodies, with an optional TTL in seconds"""
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached (body, mimetype) for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[3] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[:2]
+
+    def put(self, key, body, mimetype, config_hash=None, created=None):
+        """Stores a result; created is when it was computed (default: now), for the TTL"""
+        with self._lock:
+            self._entries[key] = (body, mimetype, config_hash, created if created is not None else time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, config_hash):
+        """Drops the entries computed for a course config"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[2] == config_hash]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedResultCache:
+    """
+    Result cache in an SQLite file shared by worker processes, with LRU and
+    TTL eviction.
+
+    A small in-memory ResultCache with the same TTL sits in front of the
+    file; its entries expire when the stored result does. Invalidating a
+    course clears the file and this process's front cache; the front caches
+    of other workers may keep entries of the old config, which are still
+    correct (a key covers everything its result depends on) and age out of
+    their LRU. Pruning runs every PRUNE_EVERY puts, so the file may briefly
+    exceed max_entries by that many entries per worker. Errors from a busy
+    or unavailable database never fail a request: lookups count as misses,
+    and stores and invalidations are skipped (stale entries still expire).
+    """
+
+    # Recency is written back at most this often per entry (seconds)
+    TOUCH_INTERVAL = 10
+    # Expired and surplus entries are pruned after this many puts per process
+    PRUNE_EVERY = 256
+
+    def __init__(self, path, max_entries=100000, ttl=3600, local_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = ResultCache(local_entries, ttl)
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+
+        # The setup connection is closed again, so no connection exists yet when
+        # the app is imported before the server forks its workers
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                config_hash TEXT,
+                body TEXT NOT NULL,
+                mimetype TEXT NOT NULL,
+                created REAL NOT NULL,
+                used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS results_config_hash ON results (config_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=1, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self):
+        """This thread's connection; a forked worker opens its own instead of using its parent's"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Returns the cached (body, mimetype) for key, or None"""
+        entry = self.local.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT body, mimetype, config_hash, created, used FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[3] <= self.ttl and now - row[4] > self.TOUCH_INTERVAL:
+                conn.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            row = None
+        if row is None or now - row[3] > self.ttl:
+            self.misses += 1
+            return None
+
+        body, mimetype, config_hash, created = row[:4]
+        self.local.put(key, body, mimetype, config_hash, created)
+        self.hits += 1
+        return body, mimetype
+
+    def put(self, key, body, mimetype, config_hash=None):
+        now = time.time()
+        self.local.put(key, body, mimetype, config_hash, now)
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO results (key, config_hash, body, mimetype, created, used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, config_hash, body, mimetype, now, now)
+            )
+            self._puts += 1
+            if self._puts % self.PRUNE_EVERY == 0:
+                self.prune()
+        except sqlite3.Error:
+            pass
+
+    def prune(self):
+        """Deletes expired entries, then the least recently used ones above max_entries"""
+        conn = self._connection()
+        conn.execute("DELETE FROM results WHERE created < ?", (time.time() - self.ttl,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def invalidate(self, config_hash):
+        """Drops the entries computed for a course config, in every worker's shared file"""
+        self.local.invalidate(config_hash)
+        try:
+            self._connection().execute("DELETE FROM results WHERE config_hash = ?", (config_hash,))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        self.local.clear()
+        try:
+            self._connection().execute("DELETE FROM results")
+        except sqlite3.Error:
+            pass
+
+    def __len__(self):
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except sqlite3.Error:
+            return len(self.local)
@@ -0,0 +1,150 @@
+"""
+Compiled course schemas.
+
+A CourseSchema flattens a course config once: the item keys
+("CategoryName_0", ...), each item's maximum score and where each category
+starts in the flat score list. Request payloads are parsed straight into that
+flat list, and Course methods work from it.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from category import Category
+from policies import parse_policy
+
+# How many compiled schemas to keep
+SCHEMA_CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+cache_stats = {'hits': 0, 'misses': 0}
+
+
+def config_hash(config):
+    """Returns a stable content hash of a course config"""
+    canonical = json.dumps(config, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def parse_score(value):
+    """Parses a submitted score: blank becomes 0, anything unparsable becomes 0"""
+    try:
+        return float(value) if value else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+class CourseSchema:
+    def __init__(self, config, content_hash=None):
+        self.config = config
+        self.hash = content_hash or config_hash(config)
+        self.total_score = config['total_score']
+
+        self.category_names = []
+        self.category_max_scores = []
+        self.category_keeps = []  # number of best items that count, None when all do
+        self.category_caps = []  # most points each category can add, or None
+        self.offsets = [0]  # category c owns items offsets[c]:offsets[c + 1]
+        self.keys = []
+        self.item_maxima = []  # maximum score of each item
+        self.item_categories = []  # category name of each item
+
+        for cat_config in config['categories']:
+            cat_name = cat_config['name']
+            item_count = cat_config['item_count']
+            keep, cap = parse_policy(cat_config)
+            # max_score is what the counted items are worth together
+            counted = keep if keep is not None else item_count
+            max_per_item = cat_config['max_score'] / counted if counted else 0
+
+            self.category_names.append(cat_name)
+            self.category_max_scores.append(cat_config['max_score'])
+            self.category_keeps.append(keep)
+            self.category_caps.append(cap)
+            for i in range(item_count):
+                self.keys.append(f"{cat_name}_{i}")
+                self.item_maxima.append(max_per_item)
+                self.item_categories.append(cat_name)
+            self.offsets.append(len(self.keys))
+
+        self.key_index = {key: index for index, key in enumerate(self.keys)}
+        self.has_policies = any(keep is not None for keep in self.category_keeps) or \
+            any(cap is not None for cap in self.category_caps)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def parse(self, data, prefix='', fallback=True):
+        """
+        Parse a request payload into a flat list of scores in item order.
+
+        Args:
+            data: Dict with keys like "CategoryName_0"
+            prefix: Optional key prefix such as "current_"
+            fallback: With a prefix, fall back to the unprefixed key when the
+                prefixed one is missing
+
+        Returns:
+            List of floats, one per item
+        """
+        if not prefix:
+            return [parse_score(data.get(key, 0)) for key in self.keys]
+        if fallback:
+            return [parse_score(data.get(prefix + key, data.get(key, 0))) for key in self.keys]
+        return [parse_score(data.get(prefix + key, 0)) for key in self.keys]
+
+    def parse_present(self, data, prefix=''):
+        """
+        Parse only the items that have a usable value in the payload.
+
+        Returns:
+            Dict of item key -> float, in item order
+        """
+        present = {}
+        for key in self.keys:
+            value = data.get(prefix + key)
+            if value:
+                try:
+                    present[key] = float(value)
+                except (ValueError, TypeError):
+                    pass
+        return present
+
+    def as_dict(self, scores):
+        """Returns the flat scores as a dict keyed like the request payload"""
+        return dict(zip(self.keys, scores))
+
+    def categories(self, scores):
+        """Builds one Category per config category from flat scores"""
+        return [
+            Category(name, scores[self.offsets[c]:self.offsets[c + 1]], self.category_max_scores[c],
+                     self.category_keeps[c], self.category_caps[c])
+            for c, name in enumerate(self.category_names)
+        ]
+
+
+def compile_schema(config):
+    """Returns the compiled schema for a config, reusing a cached one when possible"""
+    key = config_hash(config)
+    with _cache_lock:
+        schema = _cache.get(key)
+        if schema is not None:
+            _cache.move_to_end(key)
+            cache_stats['hits'] += 1
+            return schema
+        cache_stats['misses'] += 1
+
+    schema = CourseSchema(config, key)
+    with _cache_lock:
+        _cache[key] = schema
+        while len(_cache) > SCHEMA_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return schema
+
+
+def invalidate_schema(config):
+    """Drops the cached schema for a config, e.g. when its course is edited or deleted"""
+    with _cache_lock:
+        _cache.pop(config_hash(config), None)
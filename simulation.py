@@ -0,0 +1,155 @@
+import numpy as np
+
+from batch import policy_totals
+from schema import compile_schema, parse_score
+
+# Concentration used when a category has too few graded items to estimate spread
+DEFAULT_CONCENTRATION = 10.0
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+
+
+def is_graded(value):
+    """Blank or missing scores count as remaining items, anything else as graded"""
+    return value is not None and value != ''
+
+
+def fit_beta(fractions, fallback=None):
+    """
+    Fit a Beta distribution to scores expressed as fractions of the item maximum.
+
+    Uses the method of moments. Falls back to the given (a, b) when there are
+    not enough distinct scores to estimate a spread.
+
+    Returns:
+        Tuple (a, b)
+    """
+    fractions = np.clip(np.asarray(fractions, dtype=np.float64), 0, 1)
+    if len(fractions) == 0:
+        return fallback if fallback is not None else (1.0, 1.0)
+
+    # Keep the mean off 0 and 1 so both shape parameters stay positive
+    mean = min(max(fractions.mean(), 0.01), 0.99)
+    var = fractions.var()
+    if len(fractions) >= 2 and 0 < var < mean * (1 - mean):
+        concentration = mean * (1 - mean) / var - 1
+    elif fallback is not None:
+        return fallback
+    else:
+        concentration = DEFAULT_CONCENTRATION
+    return (mean * concentration, (1 - mean) * concentration)
+
+
+def simulate_totals(config, scores_by_item, n_scenarios=20000, seed=None):
+    """
+    Simulate final course totals by drawing scores for every remaining item.
+
+    Each category's remaining items are drawn from a Beta distribution fitted
+    to the student's graded items in that category, or to all graded items
+    when the category has too few of its own. Items are drawn independently.
+
+    Args:
+        config: Course configuration with category info
+        scores_by_item: Dict with keys like "CategoryName_0"; blank or missing
+            values are treated as not yet graded
+        n_scenarios: Number of scenarios to draw
+        seed: Optional seed for reproducible draws
+
+    Returns:
+        Tuple (totals, details) where totals is an array of simulated final
+        totals and details describes the fitted distribution per category
+    """
+    rng = np.random.default_rng(seed)
+
+    schema = compile_schema(config)
+
+    # Split every category into graded fractions and a count of remaining items
+    categories = []
+    all_fractions = []
+    graded_total = 0.0
+    for c, name in enumerate(schema.category_names):
+        fractions = []
+        graded = {}  # item position in the category -> score
+        remaining = 0
+        has_policy = schema.category_keeps[c] is not None or schema.category_caps[c] is not None
+        for j in range(schema.offsets[c], schema.offsets[c + 1]):
+            value = scores_by_item.get(schema.keys[j])
+            if is_graded(value):
+                score = parse_score(value)
+                graded[j - schema.offsets[c]] = score
+                if not has_policy:
+                    graded_total += score
+                if schema.item_maxima[j] > 0:
+                    fractions.append(score / schema.item_maxima[j])
+            else:
+                remaining += 1
+        max_per_item = schema.item_maxima[schema.offsets[c]] if remaining else 0
+        categories.append((c, name, max_per_item, fractions, remaining, graded if has_policy else None))
+        all_fractions.extend(fractions)
+
+    pooled = fit_beta(all_fractions)
+    totals = np.full(n_scenarios, graded_total)
+    details = []
+    for c, name, max_per_item, fractions, remaining, graded in categories:
+        a, b = fit_beta(fractions, fallback=pooled)
+        draws = None
+        if remaining and max_per_item > 0:
+            draws = rng.beta(a, b, size=(n_scenarios, remaining))
+
+        if graded is not None:
+            # Dropped items and caps depend on every score, so build the full
+            # block of graded and drawn scores for this category
+            block = np.zeros((n_scenarios, schema.offsets[c + 1] - schema.offsets[c]))
+            for j, score in graded.items():
+                block[:, j] = score
+            if draws is not None:
+                block[:, [j for j in range(block.shape[1]) if j not in graded]] = draws * max_per_item
+            totals += policy_totals(block, schema.category_keeps[c], schema.category_caps[c])
+        elif draws is not None:
+            totals += draws.sum(axis=1) * max_per_item
+        details.append({
+            "name": name,
+            "remaining_items": remaining,
+            "graded_items": len(fractions),
+            "alpha": a,
+            "beta": b,
+            "expected_percentage": a / (a + b) * 100
+        })
+
+    return totals, details
+
+
+def simulate_whatif(course_name, config, scores_by_item, target_grade, n_scenarios=20000, seed=None, bins=20):
+    """
+    Estimate the probability of finishing at or above target_grade.
+
+    Args:
+        course_name: Name of the course
+        config: Course configuration with category info
+        scores_by_item: Dict with keys like "CategoryName_0"
+        target_grade: Target final score (out of total_score)
+        n_scenarios: Number of scenarios to draw
+        seed: Optional seed for reproducible draws
+        bins: Number of histogram bins over [0, total_score]
+
+    Returns:
+        Dict with the probability, summary statistics, percentiles and a
+        histogram of the simulated final totals
+    """
+    totals, details = simulate_totals(config, scores_by_item, n_scenarios, seed)
+    counts, edges = np.histogram(totals, bins=bins, range=(0, config['total_score']))
+    percentiles = np.percentile(totals, PERCENTILES)
+
+    return {
+        "course_name": course_name,
+        "target_grade": target_grade,
+        "total_max": config['total_score'],
+        "n_scenarios": n_scenarios,
+        "probability": float(np.mean(totals >= target_grade)),
+        "mean": float(totals.mean()),
+        "std": float(totals.std()),
+        "min": float(totals.min()),
+        "max": float(totals.max()),
+        "percentiles": {str(p): float(v) for p, v in zip(PERCENTILES, percentiles)},
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+        "categories": details
+    }
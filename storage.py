@@ -0,0 +1,151 @@
+"""
+Storage backends for custom courses.
+
+Custom courses belong to an owner, an opaque ID kept in the user's session.
+Only that ID travels in the cookie; the course configurations stay on the
+server.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class CourseStore:
+    """Interface every custom course backend implements"""
+
+    def list_courses(self, owner):
+        """Returns a dict of course name -> config for the owner, oldest first"""
+        raise NotImplementedError
+
+    def list_names(self, owner):
+        """Returns the owner's course names, oldest first"""
+        return list(self.list_courses(owner).keys())
+
+    def get_course(self, owner, name):
+        """Returns the config for one course, or None if the owner has no such course"""
+        raise NotImplementedError
+
+    def save_course(self, owner, name, config):
+        """Creates or replaces a course"""
+        raise NotImplementedError
+
+    def delete_course(self, owner, name):
+        """Deletes a course, returns True if it existed"""
+        raise NotImplementedError
+
+
+class MemoryCourseStore(CourseStore):
+    """Keeps courses in a dict, for tests and single-process development"""
+
+    def __init__(self):
+        self._courses = {}
+        self._lock = threading.Lock()
+
+    def list_courses(self, owner):
+        with self._lock:
+            return dict(self._courses.get(owner, {}))
+
+    def get_course(self, owner, name):
+        with self._lock:
+            return self._courses.get(owner, {}).get(name)
+
+    def save_course(self, owner, name, config):
+        with self._lock:
+            self._courses.setdefault(owner, {})[name] = config
+
+    def delete_course(self, owner, name):
+        with self._lock:
+            return self._courses.get(owner, {}).pop(name, None) is not None
+
+
+class SQLiteCourseStore(CourseStore):
+    """Keeps courses in an SQLite database, indexed by owner and course name"""
+
+    def __init__(self, path, pool_size=5):
+        self.path = path
+        self._pool_size = pool_size
+        self._lock = threading.Lock()
+        self._reset_pool()
+
+        # The setup connection is closed rather than pooled, so a server that forks
+        # its workers after importing the app hands them no open connection
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS courses (
+                owner TEXT NOT NULL,
+                name TEXT NOT NULL,
+                config TEXT NOT NULL,
+                PRIMARY KEY (owner, name)
+            )
+        """)
+        conn.close()
+
+    def _reset_pool(self):
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._pid = os.getpid()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection, opening a new one while the pool is below size"""
+        if self._pid != os.getpid():
+            # Forked worker: connections opened by the parent must not be used here
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset_pool()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self._pool_size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def list_courses(self, owner):
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT name, config FROM courses WHERE owner = ? ORDER BY rowid", (owner,)
+            ).fetchall()
+        return {name: json.loads(config) for name, config in rows}
+
+    def list_names(self, owner):
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT name FROM courses WHERE owner = ? ORDER BY rowid", (owner,)
+            ).fetchall()
+        return [name for (name,) in rows]
+
+    def get_course(self, owner, name):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT config FROM courses WHERE owner = ? AND name = ?", (owner, name)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_course(self, owner, name, config):
+        # Upsert keeps the original rowid, so an edited course keeps its place
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO courses (owner, name, config) VALUES (?, ?, ?) "
+                "ON CONFLICT (owner, name) DO UPDATE SET config = excluded.config",
+                (owner, name, json.dumps(config))
+            )
+
+    def delete_course(self, owner, name):
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM courses WHERE owner = ? AND name = ?", (owner, name))
+        return cursor.rowcount > 0
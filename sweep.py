@@ -0,0 +1,177 @@
+"""
+Target-grade sweeps across a process pool.
+
+For every student and every target grade in a range, compute the goal scores
+the /goal route would show. Students are split into chunks and each chunk is
+solved in a worker process; results are yielded as chunks finish.
+
+Command line usage:
+    python sweep.py --config course.json --course Analysis roster.csv > sweep.jsonl
+    python sweep.py --config course.json roster.jsonl --start 60 --stop 100 --step 1 --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from course import Course
+from goal_solver import CURVE_STRATEGIES, STRATEGIES, goal_curve, goal_from_curve
+from policies import goal_ceilings
+from schema import compile_schema
+
+CHUNK_SIZE = 200
+
+# Set once per worker process by _init_worker
+_worker_course = None
+
+
+def target_range(start=50, stop=100, step=0.5):
+    """Returns the target grades from start to stop inclusive"""
+    count = int(round((stop - start) / step))
+    return [round(start + i * step, 10) for i in range(count + 1)]
+
+
+def _init_worker(course_name, config, targets, strategy):
+    """Compile the shared, read-only course state once per worker"""
+    global _worker_course
+    _worker_course = (course_name, compile_schema(config), targets, strategy)
+
+
+def sweep_student(course_name, schema, scores, targets, strategy='balanced'):
+    """
+    Solve the goal for one student at every target.
+
+    Returns:
+        Dict with the current total and a list of {'target_grade',
+        'reachable', 'goal_scores'} dicts; reachable is False when even full
+        marks on every remaining item fall short
+    """
+    course = Course.from_schema(course_name, schema, scores)
+    current_total = course.total_achieved_score()
+    ceilings = goal_ceilings(schema, scores) or [1.0] * len(scores)
+    best_total = current_total + sum(
+        max(maximum * ceiling - score, 0) for maximum, ceiling, score in zip(schema.item_maxima, ceilings, scores)
+    )
+
+    # Build the goal curve once and evaluate it at every target
+    curve = goal_curve(scores, schema.item_maxima, strategy, ceilings) if strategy in CURVE_STRATEGIES else None
+
+    rows = []
+    for target in targets:
+        if curve is not None:
+            goal_scores = goal_from_curve(schema.keys, scores, schema.item_maxima, curve, target - current_total)
+        else:
+            goal_scores = course.goal_scores_from_array(target, scores, schema, strategy)
+        rows.append({
+            "target_grade": target,
+            "reachable": target <= best_total,
+            "goal_scores": goal_scores
+        })
+    return {"current_total": current_total, "targets": rows}
+
+
+def _sweep_chunk(chunk):
+    """Worker entry point: chunk is a list of (student_id, scores) pairs"""
+    course_name, schema, targets, strategy = _worker_course
+    results = []
+    for student_id, scores in chunk:
+        result = {"student_id": student_id}
+        result.update(sweep_student(course_name, schema, scores, targets, strategy))
+        results.append(result)
+    return results
+
+
+def _chunks(course_schema, students, chunk_size):
+    """
+    Group students into (student_id, scores) chunks. Rows are parsed with the
+    gradebook's column matching, so "Homework 1" or "Final" columns work as
+    they do for gradebook.py; students without an ID get their row number.
+    """
+    from gradebook import RowMapper
+    mapper = RowMapper(course_schema)
+    chunk = []
+    for index, student in enumerate(students):
+        scores, student_id = mapper.parse_row(student)
+        chunk.append((student_id if student_id is not None else index, scores))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def sweep_targets(course_name, config, students, targets=None, strategy='balanced',
+                  workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Compute goal scores for every student at every target grade.
+
+    Args:
+        course_name: Name of the course
+        config: Course configuration with category info
+        students: Iterable of dicts shaped like a /goal payload, optionally with a student_id
+        targets: Target grades (defaults to 50 to 100 in steps of 0.5)
+        strategy: Goal strategy passed to the solver
+        workers: Number of worker processes (defaults to the CPU count)
+        chunk_size: Students per task sent to a worker
+
+    Yields:
+        One result dict per student, in the order chunks finish
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown goal strategy: {strategy}")
+    if targets is None:
+        targets = target_range()
+    workers = workers or os.cpu_count() or 1
+    schema = compile_schema(config)
+    chunks = _chunks(schema, students, chunk_size)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(course_name, config, targets, strategy)) as pool:
+        # Keep a bounded number of chunks in flight so huge rosters are not
+        # all parsed and queued up front
+        max_pending = 2 * workers
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(_sweep_chunk, chunk))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in pending:
+            yield from future.result()
+
+
+def main(argv=None):
+    from gradebook import guess_format, load_config, read_rows
+
+    parser = argparse.ArgumentParser(description="Required scores for every target grade and every student")
+    parser.add_argument('input', help="CSV or JSON-lines roster (columns as for gradebook.py), or - for stdin")
+    parser.add_argument('--config', help="JSON file with a course config (or a dict of them)")
+    parser.add_argument('--course', help="Course name in the config file or predefined courses")
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="Input format (default: from the file name)")
+    parser.add_argument('--start', type=float, default=50)
+    parser.add_argument('--stop', type=float, default=100)
+    parser.add_argument('--step', type=float, default=0.5)
+    parser.add_argument('--strategy', default='balanced')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, args.course)
+    targets = target_range(args.start, args.stop, args.step)
+    fmt = args.format or guess_format(args.input)
+
+    source = sys.stdin if args.input == '-' else open(args.input, newline='')
+    try:
+        results = sweep_targets(args.course, config, read_rows(source, fmt), targets,
+                                args.strategy, args.workers, args.chunk_size)
+        for result in results:
+            sys.stdout.write(json.dumps(result) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == '__main__':
+    main()
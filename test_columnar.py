@@ -0,0 +1,41 @@
+"""
+Checks for columnar gradebooks. Run with: python -m pytest
+"""
+import numpy as np
+import pytest
+
+from columnar import ColumnarGradebook
+
+CONFIG = {
+    'categories': [
+        {'name': 'Homework', 'item_count': 3, 'max_score': 30},
+        {'name': 'Final', 'item_count': 1, 'max_score': 70},
+    ],
+    'total_score': 100
+}
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float64'])
+def test_appends_across_blocks_read_back_the_same_rows(tmp_path, dtype):
+    rng = np.random.default_rng(18)
+    path = str(tmp_path / 'term.gcol')
+    gradebook = ColumnarGradebook.create(path, CONFIG, dtype=dtype, block_rows=4)
+
+    # Appends that end inside a block, fill one exactly and span several
+    matrices, student_ids = [], []
+    for n in (3, 1, 6, 2, 5):
+        matrix = rng.uniform(0, 10, size=(n, 4))
+        ids = [f"s{len(student_ids) + i}" for i in range(n)]
+        gradebook.append(matrix, ids)
+        matrices.append(matrix)
+        student_ids.extend(ids)
+    expected = np.vstack(matrices).astype(dtype)
+
+    for reader in (gradebook, ColumnarGradebook(path)):
+        assert len(reader) == 17
+        assert reader.n_blocks == 5
+        blocks = list(reader.blocks())
+        assert all(matrix.dtype == np.dtype(dtype) for matrix, _ in blocks)
+        assert np.array_equal(np.vstack([matrix for matrix, _ in blocks]), expected)
+        assert [i for _, ids in blocks for i in reader.decode_ids(ids)] == student_ids
+        assert np.array_equal(np.concatenate(list(reader.column('Final_0'))), expected[:, 3])
@@ -0,0 +1,38 @@
+"""
+Checks for gradebook import. Run with: python -m pytest
+"""
+import io
+
+from gradebook import grade_rows, read_rows
+from sweep import sweep_targets
+
+CONFIG = {
+    'categories': [
+        {'name': 'Homework', 'item_count': 2, 'max_score': 20},
+        {'name': 'Final', 'item_count': 1, 'max_score': 80},
+    ],
+    'total_score': 100
+}
+
+
+def test_over_long_csv_rows_ignore_the_extra_fields():
+    source = io.StringIO("student_id,Homework 1,Homework 2,Final\n"
+                         "a,5,6,70\n"
+                         "b,5,6,70,extra\n")
+    records = list(grade_rows(CONFIG, read_rows(source)))
+    assert [record['student_id'] for record in records] == ['a', 'b']
+    assert records[1] == dict(records[0], student_id='b')
+    assert records[1]['total_achieved'] == 81.0
+
+
+def test_sweep_reads_columns_like_the_gradebook():
+    keyed = "student_id,Homework_0,Homework_1,Final_0\na,5,,70\nb,15,6,\n"
+    named = "Student ID,Homework 1,Homework #2,Final\na,5,,70\nb,15,6,\n"
+    results = []
+    for text in (keyed, named):
+        rows = read_rows(io.StringIO(text))
+        results.append(sorted(sweep_targets('Course', CONFIG, rows, [80, 90], workers=1),
+                              key=lambda result: result['student_id']))
+    assert results[0] == results[1]
+    assert [result['student_id'] for result in results[1]] == ['a', 'b']
+    assert [result['current_total'] for result in results[1]] == [75.0, 21.0]
@@ -0,0 +1,207 @@
+"""
+Exactness checks for the grading core. Run with: python -m pytest
+"""
+import math
+import random
+
+import pytest
+
+import category as category_module
+from batch import grade_roster
+from category import Category
+from course import Course
+from goal_solver import goal_curve, goal_from_curve, solve_goal
+from grading_session import GradingSession
+from policies import dropped_items, goal_ceilings
+from schema import compile_schema
+
+
+def random_items(rng, max_items=12):
+    """Current scores, maxima and optional ceilings of a random set of items"""
+    n = rng.randint(0, max_items)
+    maxima = [rng.choice([0, 1, 2.5, 10, rng.uniform(0, 20)]) for _ in range(n)]
+    current = [rng.choice([0, maximum, rng.uniform(0, maximum * 1.2)]) for maximum in maxima]
+    ceilings = None
+    if rng.random() < 0.5:
+        ceilings = [rng.choice([1.0, 0.5, rng.random()]) for _ in range(n)]
+    return [f"Item_{i}" for i in range(n)], current, maxima, ceilings
+
+
+def random_policy_config(rng):
+    """A course config whose categories randomly drop, keep or cap"""
+    categories = []
+    for c in range(rng.randint(1, 4)):
+        item_count = rng.randint(1, 12)
+        category = {'name': f"C{c}", 'item_count': item_count, 'max_score': rng.choice([10, 20, 33.3])}
+        r = rng.random()
+        if r < 0.3 and item_count > 1:
+            category['drop_lowest'] = rng.randint(0, item_count - 1)
+        elif r < 0.6:
+            category['keep_best'] = rng.randint(1, item_count)
+        if rng.random() < 0.4:
+            category['cap'] = rng.choice([0, 5, category['max_score'] * 0.8, category['max_score']])
+        categories.append(category)
+    return {'categories': categories, 'total_score': 100}
+
+
+def random_student(rng, schema):
+    return {key: rng.choice(['', 1, 2, rng.uniform(0, 5), 3.3]) for key in schema.keys}
+
+
+@pytest.mark.parametrize('strategy', ['balanced', 'fewest'])
+def test_goal_curve_matches_solve_goal(strategy):
+    rng = random.Random(15)
+    for _ in range(500):
+        keys, current, maxima, ceilings = random_items(rng)
+        curve = goal_curve(current, maxima, strategy, ceilings)
+        # Breakpoints are where an off-by-one segment would show
+        breakpoints = curve.get('ends', []) + curve.get('filled', []) + [curve['total_headroom']]
+        for needed in [0, -1, rng.uniform(0, sum(maxima) + 5)] + breakpoints:
+            expected = solve_goal(keys, current, maxima, needed, strategy, ceilings=ceilings)
+            actual = goal_from_curve(keys, current, maxima, curve, needed)
+            assert actual == expected
+            assert list(actual) == list(expected)
+
+
+@pytest.mark.parametrize('strategy', ['balanced', 'fewest'])
+def test_solve_goal_covers_exactly_what_is_needed(strategy):
+    rng = random.Random(2)
+    for _ in range(500):
+        keys, current, maxima, ceilings = random_items(rng)
+        ceilings = ceilings or [1.0] * len(keys)
+        needed = rng.uniform(0, sum(maxima) + 5)
+        goals = solve_goal(keys, current, maxima, needed, strategy, ceilings=ceilings)
+        headroom = sum(max(maximum * ceiling - score, 0)
+                       for score, maximum, ceiling in zip(current, maxima, ceilings))
+        asked = sum(goal['needed'] for goal in goals.values())
+        for key, goal in goals.items():
+            i = int(key.split('_')[1])
+            assert current[i] < goal['goal'] <= maxima[i] * ceilings[i] + 1e-9
+        if needed <= headroom:
+            assert math.isclose(asked, needed, rel_tol=1e-9, abs_tol=1e-9)
+        else:
+            # Out of reach: every item is raised to its ceiling
+            assert math.isclose(asked, headroom, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def test_grade_roster_matches_course_results_with_policies():
+    rng = random.Random(16)
+    for _ in range(200):
+        config = random_policy_config(rng)
+        schema = compile_schema(config)
+        roster = [random_student(rng, schema) for _ in range(20)]
+        for graded, student in zip(grade_roster('Course', config, roster), roster):
+            expected = Course.from_schema('Course', schema, schema.parse(student)).results()
+            # Bit for bit: the batch engine sums in the same order as Category
+            assert graded['total_achieved'] == expected['total_achieved']
+            assert [c['achieved'] for c in graded['categories']] == [c['achieved'] for c in expected['categories']]
+            assert [c['percentage'] for c in graded['categories']] == [c['percentage'] for c in expected['categories']]
+
+
+def test_dropped_items_matches_sorting():
+    rng = random.Random(3)
+    for _ in range(2000):
+        n = rng.randint(1, 15)
+        values = [rng.choice([0, 1, 2, 3]) for _ in range(n)]
+        keep = rng.randint(1, n)
+        # Lowest scores go first, earlier items first among equals
+        assert dropped_items(values, keep) == set(sorted(range(n), key=lambda j: (values[j], j))[:n - keep])
+
+
+@pytest.mark.parametrize('strategy', ['balanced', 'fewest', 'proportional'])
+def test_goals_never_ask_for_points_that_do_not_count(strategy):
+    rng = random.Random(21)
+    for _ in range(200):
+        config = random_policy_config(rng)
+        schema = compile_schema(config)
+        scores = schema.parse(random_student(rng, schema))
+        course = Course.from_schema('Course', schema, scores)
+        current_total = course.total_achieved_score()
+        ceilings = goal_ceilings(schema, scores)
+
+        goals = course.goal_scores_from_array(current_total + rng.uniform(0, 30), scores, schema, strategy)
+        for c in range(len(schema.category_names)):
+            start, stop = schema.offsets[c], schema.offsets[c + 1]
+            for j in dropped_items(scores[start:stop], schema.category_keeps[c]):
+                assert ceilings[start + j] == 0.0
+                assert schema.keys[start + j] not in goals
+
+        # Every point asked for shows up in the course total
+        raised = list(scores)
+        for key, goal in goals.items():
+            raised[schema.key_index[key]] = goal['goal']
+        gained = Course.from_schema('Course', schema, raised).total_achieved_score() - current_total
+        assert math.isclose(gained, sum(goal['needed'] for goal in goals.values()), rel_tol=1e-9, abs_tol=1e-6)
+
+
+@pytest.mark.parametrize('cap', [None, 500.0])
+def test_set_item_keeps_a_running_total(monkeypatch, cap):
+    rng = random.Random(7)
+    scores = [rng.uniform(0, 10) for _ in range(1000)]
+    category = Category('Homework', scores, 10000, cap=cap)
+
+    def no_resum(*args):
+        raise AssertionError("the category was summed again")
+    # Updating a score and reading the total must not walk the whole category
+    monkeypatch.setattr(category_module, 'sum', no_resum, raising=False)
+    for _ in range(200):
+        j = rng.randrange(len(scores))
+        scores[j] = rng.uniform(0, 10)
+        category.set_item(j, scores[j])
+        expected = math.fsum(scores) if cap is None else min(math.fsum(scores), cap)
+        assert math.isclose(category.achieved_score(), expected, rel_tol=1e-12)
+
+
+def assert_close(actual, expected):
+    assert math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-9), (actual, expected)
+
+
+@pytest.mark.parametrize('strategy', ['balanced', 'fewest', 'proportional'])
+def test_session_matches_a_fresh_course(strategy):
+    rng = random.Random(13)
+    for _ in range(20):
+        config = random_policy_config(rng)
+        schema = compile_schema(config)
+        scores = schema.parse(random_student(rng, schema))
+        session = GradingSession('Course', schema, scores)
+        target_grade = rng.uniform(30, 100)
+        session.set_goal(target_grade, strategy)
+        hypothetical = {}
+
+        for _ in range(100):
+            keys = rng.sample(schema.keys, rng.randint(1, min(3, len(schema))))
+            if rng.random() < 0.7:
+                changes = {key: rng.choice([rng.uniform(0, 5), 0.1, 0.2, '']) for key in keys}
+                session.update_scores(changes)
+                for key, value in changes.items():
+                    scores[schema.key_index[key]] = value if value != '' else 0
+            else:
+                changes = {key: rng.choice([rng.uniform(0, 5), 0, None]) for key in keys}
+                session.update_whatif(changes)
+                for key, value in changes.items():
+                    if value is None:
+                        hypothetical.pop(key, None)
+                    else:
+                        hypothetical[key] = value
+
+            state = session.snapshot()
+            course = Course.from_schema('Course', schema, scores)
+            expected = course.results()
+            assert_close(state['total_achieved'], expected['total_achieved'])
+            for category, expected_category in zip(state['categories'], expected['categories']):
+                assert_close(category['achieved'], expected_category['achieved'])
+
+            whatif_scores = list(scores)
+            for key, value in hypothetical.items():
+                whatif_scores[schema.key_index[key]] = value
+            whatif = course.whatif_from_array(whatif_scores, schema)
+            if hypothetical:
+                assert_close(state['whatif']['total_achieved'], whatif['total_achieved'])
+                for expected_category in whatif['categories']:
+                    assert_close(state['whatif']['categories'][expected_category['name']]['achieved'],
+                                 expected_category['achieved'])
+
+            goal_scores = course.goal_scores_from_array(target_grade, scores, schema, strategy)
+            assert list(state['goal']['goal_scores']) == list(goal_scores)
+            for key, goal in goal_scores.items():
+                assert_close(state['goal']['goal_scores'][key]['goal'], goal['goal'])
@@ -0,0 +1,80 @@
+"""
+Checks for the shared result cache: TTL expiry, LRU pruning, invalidation
+across instances and use after a fork. Run with: python -m pytest
+"""
+import os
+
+import pytest
+
+import result_cache
+from result_cache import SharedResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable replacement for time.time"""
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = SharedResultCache(str(tmp_path / 'results.db'), ttl=60)
+    cache.put('key', 'body', 'application/json', 'config')
+    clock[0] += 59
+    assert cache.get('key') == ('body', 'application/json')
+
+    # Expired in the front cache and in the shared file alike
+    clock[0] += 2
+    assert cache.get('key') is None
+    assert SharedResultCache(str(tmp_path / 'results.db'), ttl=60).get('key') is None
+
+
+def test_prune_keeps_the_most_recently_used_entries(tmp_path, clock):
+    cache = SharedResultCache(str(tmp_path / 'results.db'), max_entries=3, ttl=10000)
+    cache.PRUNE_EVERY = 1
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key, 'text/html')
+        clock[0] += 100
+    # Read "a" through the file so its use is recorded there
+    cache.local.clear()
+    assert cache.get('a') == ('a', 'text/html')
+    clock[0] += 100
+
+    cache.put('d', 'd', 'text/html')
+    assert len(cache) == 3
+    other = SharedResultCache(str(tmp_path / 'results.db'))
+    assert other.get('b') is None
+    assert [other.get(key)[0] for key in ('a', 'c', 'd')] == ['a', 'c', 'd']
+
+
+def test_invalidate_reaches_other_instances(tmp_path):
+    path = str(tmp_path / 'results.db')
+    writer = SharedResultCache(path)
+    reader = SharedResultCache(path)
+    writer.put('old', 'old result', 'application/json', 'old-config')
+    writer.put('other', 'other result', 'application/json', 'other-config')
+
+    writer.invalidate('old-config')
+    assert writer.get('old') is None
+    assert reader.get('old') is None
+    assert reader.get('other') == ('other result', 'application/json')
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs os.fork")
+def test_forked_workers_open_their_own_connections(tmp_path):
+    cache = SharedResultCache(str(tmp_path / 'results.db'))
+    cache.put('parent', 'body', 'text/html')
+    parent_connection = cache._connection()
+
+    pid = os.fork()
+    if pid == 0:
+        # Exit status 0 only if the child used a connection of its own
+        ok = cache._connection() is not parent_connection
+        cache.local.clear()
+        ok = ok and cache.get('parent') == ('body', 'text/html')
+        cache.put('child', 'body', 'text/html')
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert cache.get('child') == ('body', 'text/html')
@@ -0,0 +1,173 @@
+"""
+What-if grids: the final total for every combination of scores on two or
+three items.
+
+Every category without a grid item adds the same points at every grid point,
+so it is computed once. Categories holding a grid item are summed item by
+item over the whole grid with broadcasting, in the same order as
+Category.achieved_score, so each grid cell equals what /whatif returns for
+that combination.
+"""
+import math
+
+import numpy as np
+
+from batch import policy_totals
+from policies import policy_total
+
+MAX_AXES = 3
+MAX_GRID_POINTS = 100000
+
+
+def axis_length(start, stop, step=1):
+    """
+    Returns how many scores axis_values(start, stop, step) gives, without building them.
+
+    Raises:
+        ValueError: If the bounds or step are not finite, the step is not
+            positive or stop is below start
+    """
+    if not all(math.isfinite(value) for value in (start, stop, step)):
+        raise ValueError("start, stop and step must be finite numbers")
+    if step <= 0:
+        raise ValueError("step must be positive")
+    span = (stop - start) / step
+    if not math.isfinite(span):
+        raise ValueError("step is too small for the range")
+    count = int(round(span))
+    if count < 0:
+        raise ValueError("stop must not be below start")
+    return count + 1
+
+
+def axis_values(start, stop, step=1):
+    """Returns the scores from start to stop inclusive"""
+    count = axis_length(start, stop, step)
+    return [round(start + i * step, 10) for i in range(count)]
+
+
+def _number(value, name):
+    """A finite float from a request field"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+
+def parse_axes(schema, axes):
+    """
+    Validate grid axes from a request.
+
+    The size of the grid is checked before any axis is built, so an
+    oversized request is rejected without allocating it.
+
+    Args:
+        schema: Compiled CourseSchema of the course
+        axes: List of {"key", "start", "stop", "step"} or {"key", "values"} dicts
+
+    Returns:
+        List of (item index, list of values) pairs
+
+    Raises:
+        ValueError: On malformed axes, unknown or repeated items, or a grid
+            that is too large
+    """
+    if not isinstance(axes, list) or not 2 <= len(axes) <= MAX_AXES:
+        raise ValueError(f"Give between 2 and {MAX_AXES} axes")
+    ranges = []
+    points = 1
+    for axis in axes:
+        if not isinstance(axis, dict):
+            raise ValueError("Each axis must be an object with a key")
+        key = axis.get('key')
+        if key not in schema.key_index:
+            raise ValueError(f"Unknown item: {key}")
+        if any(schema.key_index[key] == index for index, _ in ranges):
+            raise ValueError(f"Item used on two axes: {key}")
+        if 'values' in axis:
+            if not isinstance(axis['values'], list):
+                raise ValueError(f"values of {key} must be a list")
+            count = len(axis['values'])
+            bounds = None
+        else:
+            bounds = (_number(axis.get('start', 0), 'start'), _number(axis.get('stop'), 'stop'),
+                      _number(axis.get('step', 1), 'step'))
+            count = axis_length(*bounds)
+        if not count:
+            raise ValueError(f"No values for {key}")
+        points *= count
+        if points > MAX_GRID_POINTS:
+            raise ValueError(f"Grid has more than {MAX_GRID_POINTS} points")
+        ranges.append((schema.key_index[key], bounds if bounds is not None else axis['values']))
+
+    parsed = []
+    for index, spec in ranges:
+        if isinstance(spec, tuple):
+            values = axis_values(*spec)
+        else:
+            values = [_number(value, 'values') for value in spec]
+        parsed.append((index, values))
+    return parsed
+
+
+def grid_totals(schema, scores, axes):
+    """
+    Evaluate the course total over the Cartesian product of the axes.
+
+    Args:
+        schema: Compiled CourseSchema of the course
+        scores: Flat scores in schema item order (current scores with any
+            other hypothetical scores already merged in)
+        axes: List of (item index, values) pairs from parse_axes
+
+    Returns:
+        Array with one dimension per axis, holding the course total
+    """
+    shape = tuple(len(values) for _, values in axes)
+    # Each axis as an array that broadcasts along its own dimension
+    axis_arrays = {}
+    for dim, (index, values) in enumerate(axes):
+        view = [1] * len(shape)
+        view[dim] = len(values)
+        axis_arrays[index] = np.asarray(values, dtype=np.float64).reshape(view)
+
+    total = np.zeros(shape)
+    for c in range(len(schema.category_names)):
+        start, stop = schema.offsets[c], schema.offsets[c + 1]
+        keep, cap = schema.category_keeps[c], schema.category_caps[c]
+        if not any(start <= index < stop for index in axis_arrays):
+            total += policy_total(scores[start:stop], keep, cap)
+            continue
+
+        if keep is None and cap is None:
+            category_total = np.zeros(shape)
+            for j in range(start, stop):
+                category_total += axis_arrays.get(j, scores[j])
+        else:
+            # Dropped items and caps depend on every score: lay the category out per grid point
+            block = np.empty((int(np.prod(shape)), stop - start))
+            for j in range(start, stop):
+                block[:, j - start] = np.broadcast_to(axis_arrays.get(j, scores[j]), shape).ravel()
+            category_total = policy_totals(block, keep, cap).reshape(shape)
+        total += category_total
+    return total
+
+
+def whatif_grid(course_name, schema, scores, axes, current_total):
+    """
+    What-if totals for every combination of the axis scores.
+
+    Returns:
+        Dict with the axes, the totals as nested lists (first axis outermost)
+        and the lowest and highest total on the grid
+    """
+    totals = grid_totals(schema, scores, axes)
+    return {
+        "course_name": course_name,
+        "axes": [{"key": schema.keys[index], "values": values} for index, values in axes],
+        "totals": totals.tolist(),
+        "total_max": schema.total_score,
+        "current_total": current_total,
+        "min": float(totals.min()),
+        "max": float(totals.max())
+    }